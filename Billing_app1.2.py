@@ -1,54 +1,305 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Taken before the remaining imports
 import os
 import platform
 import sqlite3
 import subprocess
+import threading
+import queue
 import datetime
+import bisect
 import tkinter as tk
-from tkinter import ttk, messagebox, Text
-import json
+from tkinter import ttk, messagebox, Text, filedialog
 import sys
 import ctypes
 import stat
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from cryptography.fernet import Fernet
+from item_search import ItemIndex
+from billing_engine import BillingEngine, DEFAULT_CATALOG, ESTIMATE_PAGE_SIZE, REPORT_PERIODS, period_range
 
 DB_FILE = "../.sys_billing"
-CONFIG_FILE = "../items_config.json"
-GST_RATE = 0.05
+CONFIG_FILE = "../items_config.json"  # Imported into an empty database catalog; rewritten before an erase
+
+# Several counters on one database file: each saves under its own terminal ID and
+# the today total is refreshed every few seconds to pick up the other counters' sales.
+MULTI_TERMINAL = False
+TERMINAL_ID = os.environ.get("BILLING_TERMINAL_ID") or platform.node() or "main"
+TOTAL_REFRESH_MS = 5000 if MULTI_TERMINAL else 60000
+
+# Local HTTP/JSON API (billing_api.py) served next to the window, for kiosks and scales
+API_ENABLED = False
+API_PORT = 8765
+
+PRINT_TIMEOUT = 30  # Seconds a print command may run before it is killed
+REPORT_PROGRESS_LINES = 500  # Report lines built between progress updates
+REPORT_CLOSE_TIMEOUT = 10  # Seconds to wait for the report worker to release its connection
+
+# Thermal receipt output. "pdf" renders an 80mm PDF and sends it through lp/print;
+# "escpos" writes raw ESC/POS text to RECEIPT_PRINTER: "lp" (default queue, raw),
+# "lp:<queue>" for a named queue, or a device or file path such as /dev/usb/lp0.
+# Reports wider than a receipt (WIDE_REPORTS) always go through the PDF path on A4.
+RECEIPT_BACKEND = "pdf"
+RECEIPT_PRINTER = "lp"
+OPEN_CASH_DRAWER = True  # Kick the drawer after cash estimates (escpos only)
+
+WIDE_REPORTS = ("Detailed Sales Report", "Month-by-Month Sales", "Year-over-Year Sales")  # print titles
+
+ESCPOS_INIT = b"\x1b@"
+ESCPOS_FEED_AND_CUT = b"\x1bd\x04\x1dV\x00"  # feed 4 lines, full cut
+ESCPOS_DRAWER_KICK = b"\x1bp\x00\x19\xfa"  # pulse drawer pin 2
+
+ITEM_GRID_COLUMNS = 6  # Item buttons per row; only one page of buttons exists at a time
+ITEM_GRID_ROWS = 2
+
+ITEMS = []  # Populated from the database catalog
+DISPLAY_NAME = {}  # Populated from the database catalog
+ITEM_RATES = {}  # Populated from the database catalog
+shortcut_map = {}  # Populated from the database catalog
+
+class PrintSpooler:
+    # Renders and submits print jobs on a worker thread so the Tk mainloop never
+    # waits on reportlab or the system spooler. Outcomes are queued as
+    # (title, error message or None) for the UI to poll.
+    def __init__(self, receipts):
+        self.receipts = receipts
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="print-spooler", daemon=True)
+        self.worker.start()
+
+    def submit(self, content, title, receipt_key=None, open_drawer=False):
+        self.jobs.put((content, title, receipt_key, open_drawer))
+
+    def run(self):
+        while True:
+            content, title, receipt_key, open_drawer = self.jobs.get()
+            if RECEIPT_BACKEND == "escpos" and not title.startswith(WIDE_REPORTS):
+                self.results.put((title, self.send_raw(self.render_escpos(content, open_drawer))))
+                continue
+            try:
+                pdf_data = self.receipts.get_pdf(receipt_key) if receipt_key else None
+                if pdf_data is None:
+                    pdf_data = self.render_pdf(content, title)
+                    if receipt_key:
+                        self.receipts.store_pdf(receipt_key, pdf_data)
+            except ImportError:
+                self.results.put((title, "Cannot generate PDF: reportlab is not installed.\nPlease install it using "
+                                         f"'pip install reportlab' in the Python environment: {sys.executable}"))
+                continue
+            except Exception as e:
+                self.results.put((title, f"Print failed: {e}"))
+                continue
+            self.results.put((title, self.send_to_printer(pdf_data)))
+
+    def render_pdf(self, content, title):
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.units import mm
+
+        if title.startswith(WIDE_REPORTS):
+            page_width = 210 * mm  # A4
+            max_chars = 67
+        else:
+            page_width = 80 * mm  # 3-inch thermal
+            max_chars = 42
+        page_height = 297 * mm
+        buffer = BytesIO()
+        c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
+        c.setFont("Courier", 10)
+
+        y = page_height - 20
+        lines = content.split('\n')
+        for line in lines:
+            if len(line) > max_chars:
+                line = line[:max_chars]
+            c.drawString(10, y, line)
+            y -= 12
+            if y < 20:
+                c.showPage()
+                c.setFont("Courier", 10)
+                y = page_height - 20
+        c.save()
+        pdf_data = buffer.getvalue()
+        buffer.close()
+        return pdf_data
+
+    def run_print_command(self, args, data, shell=False):
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, shell=shell)
+        try:
+            process.communicate(input=data, timeout=PRINT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise RuntimeError(f"print command did not finish within {PRINT_TIMEOUT} seconds")
+        if process.returncode:
+            raise RuntimeError(f"print command exited with status {process.returncode}")
+
+    def render_escpos(self, content, open_drawer=False):
+        data = ESCPOS_INIT + content.replace("\n", "\r\n").encode("cp437", errors="replace") + b"\r\n"
+        data += ESCPOS_FEED_AND_CUT
+        if open_drawer and OPEN_CASH_DRAWER:
+            data += ESCPOS_DRAWER_KICK
+        return data
+
+    def send_raw(self, data):
+        try:
+            if RECEIPT_PRINTER == "lp" or RECEIPT_PRINTER.startswith("lp:"):
+                args = ["lp", "-o", "raw"]
+                if RECEIPT_PRINTER.startswith("lp:"):
+                    args += ["-d", RECEIPT_PRINTER[3:]]
+                self.run_print_command(args, data)
+            else:
+                with open(RECEIPT_PRINTER, "ab") as device:
+                    device.write(data)
+        except Exception as e:
+            return f"Failed to send receipt to '{RECEIPT_PRINTER}': {e}\nCheck the RECEIPT_PRINTER setting."
+        return None
 
-ITEMS = []  # Populated from JSON
-DISPLAY_NAME = {}  # Populated from JSON
-ITEM_RATES = {}  # Populated from JSON
-shortcut_map = {}  # Populated from JSON
+    def send_to_printer(self, pdf_data):
+        if platform.system() == "Windows":
+            try:
+                self.run_print_command(["print"], pdf_data, shell=True)
+            except Exception as e:
+                return f"Failed to print PDF: {e}\nEnsure a printer is installed and set as default."
+        else:
+            try:
+                self.run_print_command(["lp"], pdf_data)
+            except OSError:
+                try:
+                    self.run_print_command(["lpr"], pdf_data)
+                except Exception as e:
+                    return f"Failed to print PDF using lp/lpr: {e}\nEnsure a printer is configured with lp or lpr."
+            except Exception as e:
+                return f"Failed to print PDF using lp: {e}\nEnsure a printer is configured with lp or lpr."
+        return None
+
+class ReportWorker:
+    # Builds report text and exports on a worker thread with its own read-only
+    # connection, so a long range never holds up billing. Each job is identified by
+    # its cancel event; outcomes are queued as (job, "progress", lines so far), then
+    # (job, "done", text or return value) or (job, "error", message). Cancelled jobs
+    # report nothing.
+    def __init__(self, db_file, display_names):
+        self.db_file = db_file
+        self.display_names = display_names
+        self.engine = None
+        self.current = None
+        self.current_lock = threading.Lock()  # an interrupt must not reach the next job
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="report-worker", daemon=True)
+        self.worker.start()
+
+    def submit(self, report, *args):
+        # report names a BillingEngine *_report_lines generator
+        job = threading.Event()
+        self.jobs.put((job, report, args, True))
+        return job
+
+    def submit_call(self, method, *args):
+        # Runs any other read-only BillingEngine method, e.g. export_estimates
+        job = threading.Event()
+        self.jobs.put((job, method, args, False))
+        return job
+
+    def cancel(self, job):
+        job.set()
+        with self.current_lock:
+            if self.engine is not None and self.current is job:
+                self.engine.conn.interrupt()  # abort a query that is still running
+
+    def close(self):
+        # Releases the read-only connection, e.g. before the database file is erased.
+        # The connection belongs to the worker thread, so it is closed there.
+        # Returns False if the worker did not get to it in time.
+        if not self.worker.is_alive():
+            self.engine = None
+            return True
+        current = self.current
+        if current is not None:
+            self.cancel(current)
+        closed = threading.Event()
+        self.jobs.put((closed, None, (), False))
+        return closed.wait(REPORT_CLOSE_TIMEOUT)
+
+    def run(self):
+        while True:
+            job, report, args, stream = self.jobs.get()
+            if report is None:
+                if self.engine is not None:
+                    self.engine.close()
+                    self.engine = None
+                job.set()
+                continue
+            if job.is_set():
+                continue
+            with self.current_lock:
+                self.current = job
+            lines = []
+            report_lines = None
+            try:
+                if self.engine is None:
+                    self.engine = BillingEngine(self.db_file, display_names=self.display_names, read_only=True)
+                if not stream:
+                    result = getattr(self.engine, report)(*args)
+                    if not job.is_set():
+                        self.results.put((job, "done", result))
+                    continue
+                report_lines = getattr(self.engine, report)(*args)
+                for line in report_lines:
+                    if job.is_set():
+                        break
+                    lines.append(line)
+                    if len(lines) % REPORT_PROGRESS_LINES == 0:
+                        self.results.put((job, "progress", len(lines)))
+                else:
+                    self.results.put((job, "done", "\n".join(lines)))
+            except Exception as e:
+                if not job.is_set():
+                    self.results.put((job, "error", str(e)))
+            finally:
+                with self.current_lock:
+                    self.current = None
+                if report_lines is not None:
+                    report_lines.close()
 
 class BillingApp:
     def __init__(self, root):
         self.root = root
         self.root.title("BBK Software Solutions")
         self.root.geometry("1020x650")
-        self.items = []
-        self.current_estimate_no = None
         self.payment_mode = tk.StringVar(value="Cash")
         self.shortcut_map = {}
-        self.item_buttons = []
+        self.item_buttons = {}  # item -> its button, for the items on the visible page
+        self.item_entries = []  # (shortcut, item) in button order
+        self.item_page = 0
         self.list_new_item_button = None
         self.remove_item_button = None
+        self.engine = None
+        self.api = None
 
         os.makedirs("../reports", exist_ok=True)
 
-        self.conn = sqlite3.connect(DB_FILE)
-        self.c = self.conn.cursor()
-        self.setup_database()
+        self.open_database()
+        self.estimate = self.engine.new_estimate()
+        self.print_spooler = PrintSpooler(self.engine.receipts)
+        self.report_worker = ReportWorker(DB_FILE, DISPLAY_NAME)
+        self.report_jobs = {}  # job -> callback(kind, value) for report windows still open
         self.load_items_and_shortcuts()
         self.build_ui()
         self.bind_shortcuts()
         self.root.bind("<Control-p>", lambda e: self.generate_estimate_action())
         self.update_today_total()
+        self.start_api()
+        self.root.after(TOTAL_REFRESH_MS, self.check_day_rollover)
+        self.root.after(200, self.poll_print_results)
+        self.root.after(100, self.poll_report_results)
+
+    def start_api(self):
+        if API_ENABLED:
+            import billing_api
+            self.api = billing_api.start_in_thread(DB_FILE, port=API_PORT, terminal_id=f"{TERMINAL_ID}-api")
 
-    def setup_database(self):
+    def open_database(self):
         # Set hidden attribute on Windows
         if platform.system() == "Windows" and os.path.exists(DB_FILE):
             try:
@@ -56,23 +307,10 @@ class BillingApp:
             except Exception as e:
                 messagebox.showwarning("Warning", f"Could not hide database file: {e}")
 
-        self.c.execute("""CREATE TABLE IF NOT EXISTS estimates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            estimate_no TEXT,
-            date TEXT,
-            description TEXT,
-            qty REAL,
-            unit_price REAL,
-            total REAL,
-            payment_mode TEXT,
-            status TEXT DEFAULT 'Active'
-        )""")
-        self.c.execute("""CREATE TABLE IF NOT EXISTS estimate_master (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            estimate_no TEXT,
-            date TEXT
-        )""")
-        self.conn.commit()
+        if self.engine is None:
+            self.engine = BillingEngine(DB_FILE, display_names=DISPLAY_NAME, terminal_id=TERMINAL_ID)
+        else:
+            self.engine.open()
 
         # Ensure database file is hidden after creation
         if platform.system() == "Windows":
@@ -82,42 +320,26 @@ class BillingApp:
                 messagebox.showwarning("Warning", f"Could not hide database file: {e}")
 
     def load_items_and_shortcuts(self):
+        # The catalog lives in the database; an empty database takes the JSON
+        # config if there is one, otherwise the default two items.
+        if self.engine.catalog_is_empty():
+            try:
+                self.engine.load_catalog_file(CONFIG_FILE)
+            except FileNotFoundError:
+                self.engine.import_catalog(DEFAULT_CATALOG)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                messagebox.showwarning("Warning", f"Could not import '{CONFIG_FILE}': {e}\nUsing default items.")
+                self.engine.import_catalog(DEFAULT_CATALOG)
+        config = self.engine.export_catalog()
         ITEMS.clear()
         DISPLAY_NAME.clear()
         ITEM_RATES.clear()
         self.shortcut_map.clear()
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                ITEMS.extend(config.get("items", []))
-                DISPLAY_NAME.update(config.get("display_names", {}))
-                ITEM_RATES.update(config.get("rates", {}))
-                self.shortcut_map.update(config.get("shortcuts", {}))
-        except FileNotFoundError:
-            default_config = {
-                "items": ["Soya Oil", "Palm Oil"],
-                "display_names": {"Soya Oil": "Soya Oil", "Palm Oil": "Palm Oil"},
-                "rates": {"Soya Oil": 0.0, "Palm Oil": 0.0},
-                "shortcuts": {"1": "Soya Oil", "2": "Palm Oil"}
-            }
-            ITEMS.extend(default_config["items"])
-            DISPLAY_NAME.update(default_config["display_names"])
-            ITEM_RATES.update(default_config["rates"])
-            self.shortcut_map.update(default_config["shortcuts"])
-            self.save_items_and_shortcuts()
-
-    def save_items_and_shortcuts(self):
-        config = {
-            "items": ITEMS,
-            "display_names": DISPLAY_NAME,
-            "rates": ITEM_RATES,
-            "shortcuts": self.shortcut_map
-        }
-        try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=4)
-        except PermissionError as e:
-            messagebox.showerror("Error", f"Cannot save items config: {e}\nEnsure '{CONFIG_FILE}' is writable.")
+        ITEMS.extend(config["items"])
+        DISPLAY_NAME.update(config["display_names"])
+        ITEM_RATES.update(config["rates"])
+        self.shortcut_map.update(config["shortcuts"])
+        self.item_index = ItemIndex(ITEMS, DISPLAY_NAME)
 
     def build_ui(self):
         top = tk.Frame(self.root)
@@ -132,26 +354,36 @@ class BillingApp:
         tk.Radiobutton(mode_frame, text="Cash", variable=self.payment_mode, value="Cash").pack(side=tk.LEFT, padx=10)
         tk.Radiobutton(mode_frame, text="Credit", variable=self.payment_mode, value="Credit").pack(side=tk.LEFT, padx=10)
 
+        self.build_search(self.root)
+
         self.items_frame = tk.LabelFrame(self.root, text="Items")
         self.items_frame.pack(fill=tk.X, padx=10, pady=6)
-        self.canvas = tk.Canvas(self.items_frame, height=80)
-        self.scrollbar = tk.Scrollbar(self.items_frame, orient="horizontal", command=self.canvas.xview)
-        self.canvas.configure(xscrollcommand=self.scrollbar.set)
-        self.scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
-        self.canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-        self.inner_frame = tk.Frame(self.canvas)
-        self.canvas_frame = self.canvas.create_window((0, 0), window=self.inner_frame, anchor="nw")
-        self.inner_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-
-        for shortcut, item in sorted(self.shortcut_map.items(), key=lambda x: x[0]):
-            btn = tk.Button(self.inner_frame, text=f"{shortcut} - {item}", width=18,
-                            command=lambda it=item: self.open_qty_popup(it))
-            btn.pack(side=tk.LEFT, padx=6, pady=6)
-            self.item_buttons.append(btn)
-        self.list_new_item_button = tk.Button(self.inner_frame, text="List New Item", width=18, command=self.list_new_item)
-        self.list_new_item_button.pack(side=tk.LEFT, padx=6, pady=6)
-        self.remove_item_button = tk.Button(self.inner_frame, text="Remove Items", width=18, command=self.remove_item)
-        self.remove_item_button.pack(side=tk.LEFT, padx=6, pady=6)
+        # A fixed grid of button slots showing one page of the catalog; paging
+        # reconfigures the slots instead of creating a widget per item.
+        grid_frame = tk.Frame(self.items_frame)
+        grid_frame.pack(side=tk.TOP, fill=tk.X)
+        self.item_slots = []
+        for i in range(ITEM_GRID_ROWS * ITEM_GRID_COLUMNS):
+            btn = tk.Button(grid_frame, width=18)
+            btn.grid(row=i // ITEM_GRID_COLUMNS, column=i % ITEM_GRID_COLUMNS, padx=6, pady=4)
+            btn.bind("<MouseWheel>", lambda e: self.show_item_page(self.item_page + (1 if e.delta < 0 else -1)))
+            btn.bind("<Button-4>", lambda e: self.show_item_page(self.item_page - 1))
+            btn.bind("<Button-5>", lambda e: self.show_item_page(self.item_page + 1))
+            self.item_slots.append(btn)
+
+        nav_frame = tk.Frame(self.items_frame)
+        nav_frame.pack(side=tk.TOP, fill=tk.X)
+        tk.Button(nav_frame, text="<", width=3, command=lambda: self.show_item_page(self.item_page - 1)).pack(side=tk.LEFT, padx=6, pady=4)
+        self.item_page_label = tk.Label(nav_frame, width=14)
+        self.item_page_label.pack(side=tk.LEFT)
+        tk.Button(nav_frame, text=">", width=3, command=lambda: self.show_item_page(self.item_page + 1)).pack(side=tk.LEFT, padx=6, pady=4)
+        self.list_new_item_button = tk.Button(nav_frame, text="List New Item", width=18, command=self.list_new_item)
+        self.list_new_item_button.pack(side=tk.LEFT, padx=6, pady=4)
+        self.remove_item_button = tk.Button(nav_frame, text="Remove Items", width=18, command=self.remove_item)
+        self.remove_item_button.pack(side=tk.LEFT, padx=6, pady=4)
+
+        self.item_entries = sorted(self.shortcut_map.items(), key=self.item_entry_key)
+        self.show_item_page(0)
 
         cols = ("#", "Description", "Qty", "Unit Price", "Total")
         self.tree = ttk.Treeview(self.root, columns=cols, show="headings", height=12)
@@ -175,10 +407,90 @@ class BillingApp:
 
         self.today_total_label = tk.Label(self.root, text="Today's Sales Total: 0.00", font=("Arial", 12, "bold"))
         self.today_total_label.pack(pady=5)
+        self.today_total_label.bind("<Double-Button-1>", lambda e: self.update_today_total(recompute=True))
+        self.print_status_label = tk.Label(self.root, text="", font=("Arial", 9))
+        self.print_status_label.pack()
+
+    def build_search(self, parent):
+        # Type-ahead item search. Item shortcuts ignore keys typed into the entry and
+        # result list (see bind_shortcuts); Ctrl+P and Ctrl+F still work from them.
+        frame = tk.LabelFrame(parent, text="Search Items (Ctrl+F)")
+        frame.pack(fill=tk.X, padx=10, pady=6)
+        self.search_var = tk.StringVar()
+        self.search_matches = []
+        self.search_entry = tk.Entry(frame, textvariable=self.search_var, width=30)
+        self.search_entry.pack(side=tk.LEFT, padx=6, pady=6, anchor="n")
+        self.search_results = tk.Listbox(frame, height=4, width=60, exportselection=False)
+        self.search_results.pack(side=tk.LEFT, padx=6, pady=6, fill=tk.X, expand=True)
+
+        def update_results(*args):
+            self.search_matches = self.item_index.search(self.search_var.get())
+            self.search_results.delete(0, tk.END)
+            for item in self.search_matches:
+                name = DISPLAY_NAME.get(item, item)
+                self.search_results.insert(tk.END, item if name == item else f"{item} ({name})")
+            if self.search_results.size():
+                self.search_results.selection_set(0)
+
+        def choose(event=None):
+            selection = self.search_results.curselection()
+            if not selection:
+                return "break"
+            item = self.search_matches[selection[0]]
+            self.search_var.set("")
+            self.open_qty_popup(item)
+            return "break"
+
+        def move(step):
+            size = self.search_results.size()
+            if size:
+                selection = self.search_results.curselection()
+                index = min(max((selection[0] if selection else -1) + step, 0), size - 1)
+                self.search_results.selection_clear(0, tk.END)
+                self.search_results.selection_set(index)
+                self.search_results.see(index)
+            return "break"
+
+        self.search_var.trace_add("write", update_results)
+        self.search_entry.bind("<Return>", choose)
+        self.search_entry.bind("<Down>", lambda e: move(1))
+        self.search_entry.bind("<Up>", lambda e: move(-1))
+        self.search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        self.search_results.bind("<Double-Button-1>", choose)
+        self.search_results.bind("<Return>", choose)
+        self.root.bind("<Control-f>", lambda e: self.search_entry.focus_set())
+
+    def item_entry_key(self, entry):
+        # Numeric shortcut order: "2" before "10"
+        return len(entry[0]), entry[0]
+
+    def show_item_page(self, page, item=None):
+        # Shows the given page, or the page holding item, in the button slots.
+        per_page = len(self.item_slots)
+        pages = max(1, -(-len(self.item_entries) // per_page))
+        if item is not None:
+            page = next((i // per_page for i, (_, it) in enumerate(self.item_entries) if it == item), page)
+        self.item_page = min(max(page, 0), pages - 1)
+        self.item_buttons.clear()
+        start = self.item_page * per_page
+        for btn, entry in zip(self.item_slots, self.item_entries[start:start + per_page] + [None] * per_page):
+            if entry is None:
+                btn.config(text="", command="", state=tk.DISABLED, relief=tk.FLAT)
+                continue
+            shortcut, it = entry
+            btn.config(text=f"{shortcut} - {it}", command=lambda it=it: self.open_qty_popup(it),
+                       state=tk.NORMAL, relief=tk.RAISED)
+            self.item_buttons[it] = btn
+        self.item_page_label.config(text=f"Page {self.item_page + 1} of {pages}")
 
     def bind_shortcuts(self):
         for shortcut, item in self.shortcut_map.items():
-            self.root.bind(shortcut, lambda e, it=item: self.open_qty_popup(it))
+            self.root.bind(shortcut, lambda e, it=item: self.shortcut_pressed(e, it))
+
+    def shortcut_pressed(self, event, item):
+        if isinstance(event.widget, (tk.Entry, tk.Listbox)):
+            return  # typing in the search box
+        self.open_qty_popup(item)
 
     def unbind_shortcuts(self):
         for shortcut in self.shortcut_map:
@@ -215,21 +527,19 @@ class BillingApp:
                 messagebox.showerror("Error", f"Item '{item_name}' already exists")
                 return
 
+            try:
+                self.engine.add_item(item_name, shortcut)
+            except sqlite3.Error as e:
+                messagebox.showerror("Error", f"Could not save item: {e}")
+                return
             ITEMS.append(item_name)
             DISPLAY_NAME[item_name] = item_name
             ITEM_RATES[item_name] = 0.0
             self.shortcut_map[shortcut] = item_name
-            self.save_items_and_shortcuts()
-
-            btn = tk.Button(self.inner_frame, text=f"{shortcut} - {item_name}", width=18,
-                            command=lambda it=item_name: self.open_qty_popup(it))
-            btn.pack(side=tk.LEFT, padx=6, pady=6)
-            self.item_buttons.append(btn)
+            self.item_index.add(item_name, item_name)
 
-            self.list_new_item_button.pack_forget()
-            self.remove_item_button.pack_forget()
-            self.list_new_item_button.pack(side=tk.LEFT, padx=6, pady=6)
-            self.remove_item_button.pack(side=tk.LEFT, padx=6, pady=6)
+            bisect.insort(self.item_entries, (shortcut, item_name), key=self.item_entry_key)
+            self.show_item_page(self.item_page, item=item_name)
 
             self.bind_shortcuts()
             messagebox.showinfo("Success", f"Item '{item_name}' added with shortcut '{shortcut}'")
@@ -259,24 +569,20 @@ class BillingApp:
             if not messagebox.askyesno("Confirm", f"Remove item '{item_name}' and its shortcut?"):
                 return
 
+            try:
+                self.engine.remove_item(item_name)
+            except sqlite3.Error as e:
+                messagebox.showerror("Error", f"Could not remove item: {e}")
+                return
+            self.engine.note_write()  # reports rendered with its display name are stale
             ITEMS.remove(item_name)
+            self.item_index.remove(item_name)
             DISPLAY_NAME.pop(item_name, None)
             ITEM_RATES.pop(item_name, None)
-            shortcut = next((k for k, v in self.shortcut_map.items() if v == item_name), None)
-            if shortcut:
-                self.shortcut_map.pop(shortcut, None)
-
-            for btn in self.item_buttons[:]:
-                if btn["text"].endswith(item_name):
-                    btn.destroy()
-                    self.item_buttons.remove(btn)
-                    break
-
-            self.save_items_and_shortcuts()
-            self.list_new_item_button.pack_forget()
-            self.remove_item_button.pack_forget()
-            self.list_new_item_button.pack(side=tk.LEFT, padx=6, pady=6)
-            self.remove_item_button.pack(side=tk.LEFT, padx=6, pady=6)
+            for shortcut in [k for k, v in self.shortcut_map.items() if v == item_name]:
+                self.shortcut_map.pop(shortcut)
+            self.item_entries = [entry for entry in self.item_entries if entry[1] != item_name]
+            self.show_item_page(self.item_page)
 
             self.bind_shortcuts()
             messagebox.showinfo("Success", f"Item '{item_name}' removed")
@@ -285,19 +591,10 @@ class BillingApp:
         tk.Button(p, text="Remove Item", command=remove, width=14).grid(row=1, column=0, columnspan=2, pady=(6, 10))
         p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
 
-    def today_str(self):
-        return datetime.datetime.now().strftime("%Y-%m-%d")
-
-    def next_estimate_no(self):
-        self.c.execute("SELECT MAX(id) FROM estimate_master")
-        mid = self.c.fetchone()[0]
-        seq = 1 if mid is None else mid + 1
-        return f"abc/{datetime.datetime.now().year}/{seq:04d}"
-
     def start_new_estimate(self):
-        if not self.current_estimate_no:
-            self.current_estimate_no = self.next_estimate_no()
-            self.estimate_label.config(text=f"Estimate No: {self.current_estimate_no}")
+        # Drafts show the provisional next number; the saved number is allocated
+        # when the estimate is committed and may differ if another counter saved first.
+        self.estimate_label.config(text=f"Estimate No: {self.engine.next_estimate_no()} (provisional)")
 
     def open_qty_popup(self, item):
         self.start_new_estimate()
@@ -336,27 +633,35 @@ class BillingApp:
         p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
 
     def add_item(self, desc, qty, rate):
-        self.items.append({"desc": desc, "qty": qty, "rate": rate, "total": round(qty * rate, 2)})
-        self.refresh_table()
+        line = self.estimate.add_line(desc, qty, rate)
+        iid = self.tree.insert("", "end", values=(len(self.estimate.lines), line["desc"], line["qty"],
+                                                  f"{line['rate']:.2f}", f"{line['total']:.2f}"))
+        self.tree.see(iid)
+        self.update_estimate_total()
 
     def refresh_table(self):
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
-        total = 0.0
-        for i, it in enumerate(self.items, start=1):
+        # Full rebuild, for a new or reset estimate; edits go through add_item
+        # and remove_selected_item, which only touch the affected rows.
+        self.tree.delete(*self.tree.get_children())
+        for i, it in enumerate(self.estimate.lines, start=1):
             self.tree.insert("", "end", values=(i, it["desc"], it["qty"], f"{it['rate']:.2f}", f"{it['total']:.2f}"))
-            total += it["total"]
-        total_incl = round(total * (1 + GST_RATE), 2)
-        self.total_label.config(text=f"Total: {total_incl:.2f}")
+        self.update_estimate_total()
+
+    def update_estimate_total(self):
+        self.total_label.config(text=f"Total: {self.estimate.total:.2f}")
 
     def remove_selected_item(self):
         sel = self.tree.selection()
         if not sel:
             return
-        idx = int(self.tree.item(sel[0], "values")[0]) - 1
-        if 0 <= idx < len(self.items):
-            del self.items[idx]
-            self.refresh_table()
+        idx = self.tree.index(sel[0])
+        if 0 <= idx < len(self.estimate.lines):
+            self.estimate.remove_line(idx)
+            self.tree.delete(sel[0])
+            # Renumber only the rows after the removed one
+            for number, iid in enumerate(self.tree.get_children()[idx:], start=idx + 1):
+                self.tree.set(iid, "#", number)
+            self.update_estimate_total()
 
     def set_item_rates(self):
         p = tk.Toplevel(self.root)
@@ -372,10 +677,10 @@ class BillingApp:
 
         def save():
             try:
-                for item in ITEMS:
-                    rate = float(rate_vars[item].get())
-                    ITEM_RATES[item] = rate
-                self.save_items_and_shortcuts()
+                rates = {item: float(rate_vars[item].get()) for item in ITEMS}
+                changed = {item: rate for item, rate in rates.items() if rate != ITEM_RATES.get(item)}
+                self.engine.set_item_rates(changed)
+                ITEM_RATES.update(changed)
                 messagebox.showinfo("Saved", "Rates updated.")
                 p.destroy()
             except Exception:
@@ -383,75 +688,100 @@ class BillingApp:
 
         tk.Button(p, text="Save", command=save, width=14).grid(row=len(ITEMS), column=0, columnspan=2, pady=(6, 10))
 
-    def print_text_content(self, content, title="Print"):
-        try:
-            if title.startswith("Detailed Sales Report"):
-                page_width = 210 * mm  # A4
-                max_chars = 67
-            else:
-                page_width = 80 * mm  # 3-inch thermal
-                max_chars = 42
-            page_height = 297 * mm
-            buffer = BytesIO()
-            c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
-            c.setFont("Courier", 10)
-
-            y = page_height - 20
-            lines = content.split('\n')
-            for line in lines:
-                if len(line) > max_chars:
-                    line = line[:max_chars]
-                c.drawString(10, y, line)
-                y -= 12
-                if y < 20:
-                    c.showPage()
-                    c.setFont("Courier", 10)
-                    y = page_height - 20
-            c.save()
-            pdf_data = buffer.getvalue()
-            buffer.close()
-
-            if platform.system() == "Windows":
-                try:
-                    process = subprocess.Popen(["print"], stdin=subprocess.PIPE, shell=True)
-                    process.communicate(input=pdf_data)
-                except Exception as e:
-                    messagebox.showwarning("Print Error", f"Failed to print PDF: {e}\nEnsure a printer is installed and set as default.")
-                    return
+    def print_text_content(self, content, title="Print", receipt_key=None, open_drawer=False):
+        self.print_spooler.submit(content, title, receipt_key, open_drawer)
+        self.print_status_label.config(text=f"Printing: {title}")
+
+    def poll_print_results(self):
+        while True:
+            try:
+                title, error = self.print_spooler.results.get_nowait()
+            except queue.Empty:
+                break
+            if error:
+                self.print_status_label.config(text=f"Print failed: {title}")
+                messagebox.showwarning("Print Error", error)
             else:
-                try:
-                    process = subprocess.Popen(["lp"], stdin=subprocess.PIPE)
-                    process.communicate(input=pdf_data)
-                except Exception:
-                    try:
-                        process = subprocess.Popen(["lpr"], stdin=subprocess.PIPE)
-                        process.communicate(input=pdf_data)
-                    except Exception as e:
-                        messagebox.showwarning("Print Error", f"Failed to print PDF using lp/lpr: {e}\nEnsure a printer is configured with lp or lpr.")
-                        return
-        except ImportError as e:
-            messagebox.showerror("Print Error", f"Cannot generate PDF: reportlab is not installed.\nPlease install it using 'pip install reportlab' in the Python environment: {sys.executable}")
-            return
-        except Exception as e:
-            messagebox.showwarning("Print Error", f"Print failed: {e}")
-            return
+                self.print_status_label.config(text=f"Printed: {title}")
+        self.root.after(200, self.poll_print_results)
+
+    def poll_report_results(self):
+        while True:
+            try:
+                job, kind, value = self.report_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            callback = self.report_jobs.get(job)
+            if callback is None:
+                continue  # window already closed
+            if kind != "progress":
+                del self.report_jobs[job]
+            callback(kind, value)
+        self.root.after(100, self.poll_report_results)
 
     def open_reports_menu(self):
         p = tk.Toplevel(self.root)
         p.title("Reports Menu")
         p.resizable(False, False)
         p.grab_set()
-        tk.Button(p, text="Daily Sales Report", command=self.show_daily_sales_report, width=30).pack(pady=6)
-        tk.Button(p, text="Detailed Sales Report", command=self.show_detailed_sales_report, width=30).pack(pady=6)
-        tk.Button(p, text="Cancelled Estimates Report", command=self.show_cancelled_estimates_report, width=30).pack(pady=6)
+
+        period_frame = tk.Frame(p)
+        period_frame.pack(padx=10, pady=(10, 4))
+        tk.Label(period_frame, text="Period").grid(row=0, column=0, sticky="w")
+        period_var = tk.StringVar(value=REPORT_PERIODS[0])
+        period_box = ttk.Combobox(period_frame, textvariable=period_var, values=REPORT_PERIODS + ("Custom",),
+                                  state="readonly", width=20)
+        period_box.grid(row=0, column=1, columnspan=3, sticky="w", padx=6, pady=4)
+        from_var = tk.StringVar()
+        to_var = tk.StringVar()
+        tk.Label(period_frame, text="From").grid(row=1, column=0, sticky="w")
+        from_entry = tk.Entry(period_frame, textvariable=from_var, width=12)
+        from_entry.grid(row=1, column=1, padx=6, pady=4)
+        tk.Label(period_frame, text="To").grid(row=1, column=2, sticky="w")
+        to_entry = tk.Entry(period_frame, textvariable=to_var, width=12)
+        to_entry.grid(row=1, column=3, padx=6, pady=4)
+
+        def fill_period(event=None):
+            if period_var.get() != "Custom":
+                date_from, date_to = period_range(period_var.get())
+                from_var.set(date_from)
+                to_var.set(date_to)
+
+        def selected_range():
+            try:
+                date_from = datetime.datetime.strptime(from_var.get().strip(), "%Y-%m-%d").date()
+                date_to = datetime.datetime.strptime(to_var.get().strip(), "%Y-%m-%d").date()
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format")
+                return None
+            if date_from > date_to:
+                messagebox.showerror("Error", "From date is after To date")
+                return None
+            return date_from.isoformat(), date_to.isoformat()
+
+        def run(show):
+            date_range = selected_range()
+            if date_range:
+                show(*date_range)
+
+        period_box.bind("<<ComboboxSelected>>", fill_period)
+        for entry in (from_entry, to_entry):
+            entry.bind("<Key>", lambda e: period_var.set("Custom"))
+        fill_period()
+
+        tk.Button(p, text="Daily Sales Report", command=lambda: run(self.show_daily_sales_report), width=30).pack(pady=6)
+        tk.Button(p, text="Detailed Sales Report", command=lambda: run(self.show_detailed_sales_report), width=30).pack(pady=6)
+        tk.Button(p, text="Cancelled Estimates Report", command=lambda: run(self.show_cancelled_estimates_report), width=30).pack(pady=6)
+        tk.Button(p, text="Month-by-Month Sales", command=lambda: run(self.show_monthly_sales_report), width=30).pack(pady=6)
+        tk.Button(p, text="Year-over-Year Sales", command=self.show_yearly_sales_report, width=30).pack(pady=6)
+        tk.Button(p, text="Terminal Totals", command=lambda: run(self.show_terminal_totals_report), width=30).pack(pady=6)
+        tk.Button(p, text="Export Estimates...", command=lambda: run(self.export_estimates), width=30).pack(pady=6)
         p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
 
-    def preview_estimate(self):
-        if not self.items:
-            return messagebox.showerror("Error", "No items in estimate")
+    def show_text_window(self, title, text_content, print_title, geometry="600x400", receipt_key=None):
         p = tk.Toplevel(self.root)
-        p.title("Estimate Preview")
-        p.geometry("600x400")
+        p.title(title)
+        p.geometry(geometry)
         p.grab_set()
         self.unbind_shortcuts()
 
@@ -461,237 +791,222 @@ class BillingApp:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         text.config(yscrollcommand=scrollbar.set)
 
-        content = []
-        content.append("BBK Software Solutions")
-        content.append("-" * 42)
-        display_est = self.current_estimate_no or "N/A"
-        content.append(f"Estimate: {display_est:<20}")
-        content.append(f"Date: {datetime.datetime.now().strftime('%d-%m-%Y'):<20}")
-        content.append("")
-        content.append(f"{'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}")
-        content.append("-" * 42)
-
-        total = 0.0
-        for it in self.items:
-            name = DISPLAY_NAME.get(it["desc"], it["desc"])[:20]
-            content.append(f"{name:<20} {it['qty']:>8.2f} {it['rate']:>8.2f} {it['total']:>8.2f}")
-            total += it["total"]
-
-        total_incl = round(total * (1 + GST_RATE), 2)
-        content.append("-" * 42)
-        content.append(f"{'Subtotal':<36} {total:>8.2f}")
-        content.append(f"{'GST (5%)':<36} {round(total * GST_RATE, 2):>8.2f}")
-        content.append(f"{'TOTAL':<36} {total_incl:>8.2f}")
-        content.append(f"{'Mode':<36} {self.payment_mode.get():>8}")
-
-        text_content = "\n".join(content)
         text.insert(tk.END, text_content)
         text.config(state=tk.DISABLED)
 
         button_frame = tk.Frame(p)
         button_frame.pack(fill=tk.X, padx=10, pady=10)
-        tk.Button(button_frame, text="Print", command=lambda: self.print_text_content(text_content, "Estimate Preview")).pack(side=tk.LEFT, padx=8)
+        tk.Button(button_frame, text="Print", command=lambda: self.print_text_content(text_content, print_title, receipt_key)).pack(side=tk.LEFT, padx=8)
         p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
 
-    def generate_estimate_action(self):
-        if not self.items:
-            return messagebox.showerror("Error", "No items in estimate")
-        if not self.current_estimate_no:
-            self.start_new_estimate()
-        date_str = self.today_str()
-        self.c.execute("INSERT INTO estimate_master(estimate_no,date) VALUES(?,?)", (self.current_estimate_no, date_str))
-        for it in self.items:
-            self.c.execute("""INSERT INTO estimates
-                              (estimate_no,date,description,qty,unit_price,total,payment_mode,status)
-                              VALUES (?,?,?,?,?,?,?, 'Active')""",
-                           (self.current_estimate_no, date_str, it["desc"], it["qty"], it["rate"], it["total"], self.payment_mode.get()))
-        self.conn.commit()
-
-        content = []
-        content.append("BBK Software Solutions")
-        content.append("-" * 42)
-        content.append(f"Estimate: {self.current_estimate_no:<20}")
-        content.append(f"Date: {datetime.datetime.now().strftime('%d-%m-%Y'):<20}")
-        content.append("")
-        content.append(f"{'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}")
-        content.append("-" * 42)
-
-        total = 0.0
-        for it in self.items:
-            name = DISPLAY_NAME.get(it["desc"], it["desc"])[:20]
-            content.append(f"{name:<20} {it['qty']:>8.2f} {it['rate']:>8.2f} {it['total']:>8.2f}")
-            total += it["total"]
-
-        total_incl = round(total * (1 + GST_RATE), 2)
-        content.append("-" * 42)
-        content.append(f"{'Subtotal':<36} {total:>8.2f}")
-        content.append(f"{'GST (5%)':<36} {round(total * GST_RATE, 2):>8.2f}")
-        content.append(f"{'TOTAL':<36} {total_incl:>8.2f}")
-        content.append(f"{'Mode':<36} {self.payment_mode.get():>8}")
-
-        text_content = "\n".join(content)
-        self.print_text_content(text_content, f"Estimate {self.current_estimate_no}")
-
-        self.items.clear()
-        self.current_estimate_no = None
-        self.refresh_table()
-        self.estimate_label.config(text="Estimate No: ")
-        self.update_today_total()
-
-    def show_daily_sales_report(self):
-        t = self.today_str()
-        self.c.execute("""SELECT payment_mode, description, SUM(qty) AS q, SUM(total) AS s
-                          FROM estimates
-                          WHERE date=? AND status='Active'
-                          GROUP BY payment_mode, description
-                          ORDER BY payment_mode, description""", (t,))
-        rows = self.c.fetchall()
+    def show_report_window(self, title, report, args, print_title, geometry="600x400"):
+        # Opens at once with a progress bar; the text is built by the report worker
+        # and filled in when ready. Closing the window cancels the job. A report
+        # whose data has not changed since it was last built reopens from the cache.
+        key = (report, args, self.engine.today_str())
+        stamp = self.engine.report_stamp()
+        cached = self.engine.cached_report(key, stamp)
+        if cached is not None:
+            return self.show_text_window(title, cached, print_title, geometry)
 
         p = tk.Toplevel(self.root)
-        p.title("Daily Sales Report")
-        p.geometry("600x400")
+        p.title(title)
+        p.geometry(geometry)
         p.grab_set()
         self.unbind_shortcuts()
 
-        text = Text(p, wrap=tk.WORD, font=("Courier", 10))
-        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        scrollbar = tk.Scrollbar(p, orient=tk.VERTICAL, command=text.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        text.config(yscrollcommand=scrollbar.set)
+        status = tk.Label(p, text="Preparing report...", anchor="w")
+        status.pack(fill=tk.X, padx=10, pady=(10, 0))
+        progress = ttk.Progressbar(p, mode="indeterminate")
+        progress.pack(fill=tk.X, padx=10, pady=(4, 0))
+        progress.start(10)
 
-        content = []
-        content.append("Daily Sales Report")
-        content.append(f"Date: {t}")
-        content.append("-" * 42)
-        grand_total = 0.0
-        for mode in ("Cash", "Credit"):
-            content.append(f"{mode} Sales:")
-            content.append(f"{'Item':<20} {'Qty':>8} {'Amount':>8}")
-            content.append("-" * 42)
-            mode_rows = [r for r in rows if r[0] == mode]
-            mode_base = 0.0
-            for _, desc, q, s in mode_rows:
-                name = DISPLAY_NAME.get(desc, desc)[:20]
-                content.append(f"{name:<20} {q:>8.2f} {s:>8.2f}")
-                mode_base += float(s or 0)
-            mode_incl = round(mode_base * (1 + GST_RATE), 2)
-            grand_total += mode_incl
-            content.append("-" * 42)
-            content.append(f"{'Subtotal':<36} {mode_base:>8.2f}")
-            content.append(f"{'GST (5%)':<36} {round(mode_base * GST_RATE, 2):>8.2f}")
-            content.append(f"{'Total':<36} {mode_incl:>8.2f}")
-            content.append("")
-
-        content.append("-" * 42)
-        content.append(f"{'Grand Total':<36} {grand_total:>8.2f}")
-
-        text_content = "\n".join(content)
-        text.insert(tk.END, text_content)
+        button_frame = tk.Frame(p)
+        button_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
+        print_button = tk.Button(button_frame, text="Print", state=tk.DISABLED)
+        print_button.pack(side=tk.LEFT, padx=8)
+
+        scrollbar = tk.Scrollbar(p, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text = Text(p, wrap=tk.WORD, font=("Courier", 10), yscrollcommand=scrollbar.set)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        scrollbar.config(command=text.yview)
         text.config(state=tk.DISABLED)
 
-        button_frame = tk.Frame(p)
-        button_frame.pack(fill=tk.X, padx=10, pady=10)
-        tk.Button(button_frame, text="Print", command=lambda: self.print_text_content(text_content, "Daily Sales Report")).pack(side=tk.LEFT, padx=8)
-        p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
+        job = self.report_worker.submit(report, *args)
 
-    def show_detailed_sales_report(self):
-        t = self.today_str()
-        p = tk.Toplevel(self.root)
-        p.title("Detailed Sales Report")
-        p.geometry("800x600")
-        p.grab_set()
-        self.unbind_shortcuts()
+        def on_result(kind, value):
+            if kind == "progress":
+                status.config(text=f"Preparing report... {value} lines")
+                return
+            progress.stop()
+            progress.pack_forget()
+            if kind == "error":
+                status.config(text=f"Report failed: {value}")
+                return
+            self.engine.store_report(key, stamp, value)
+            status.pack_forget()
+            text.config(state=tk.NORMAL)
+            text.insert(tk.END, value)
+            text.config(state=tk.DISABLED)
+            print_button.config(state=tk.NORMAL, command=lambda: self.print_text_content(value, print_title))
+
+        def close():
+            if self.report_jobs.pop(job, None) is not None:
+                self.report_worker.cancel(job)
+            p.destroy()
+            self.bind_shortcuts()
 
-        text = Text(p, wrap=tk.WORD, font=("Courier", 10))
-        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        scrollbar = tk.Scrollbar(p, orient=tk.VERTICAL, command=text.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        text.config(yscrollcommand=scrollbar.set)
+        self.report_jobs[job] = on_result
+        p.protocol("WM_DELETE_WINDOW", close)
 
-        content = []
-        content.append("Detailed Sales Report")
-        content.append(f"Date: {t}")
-        content.append("")
-        content.append(f"{'Estimate No':<20} {'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}")
-        content.append("-" * 67)
-
-        grand_total = 0.0
-        for mode in ("Cash", "Credit"):
-            content.append(f"{mode} Estimates")
-            content.append(f"{'Estimate No':<20} {'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}")
-            content.append("-" * 67)
-
-            self.c.execute("""SELECT estimate_no, description, qty, unit_price, total
-                              FROM estimates
-                              WHERE date=? AND payment_mode=? AND status='Active'
-                              ORDER BY estimate_no""", (t, mode))
-            rows = self.c.fetchall()
-            mode_base = 0.0
-            for est, desc, qty, rate, total in rows:
-                name = DISPLAY_NAME.get(desc, desc)[:20]
-                content.append(f"{est:<20} {name:<20} {qty:>8.2f} {rate:>8.2f} {total:>8.2f}")
-                mode_base += float(total or 0)
-            mode_incl = round(mode_base * (1 + GST_RATE), 2)
-            grand_total += mode_incl
-            content.append("")
-            content.append(f"{'Subtotal':<56} {mode_base:>8.2f}")
-            content.append(f"{'GST (5%)':<56} {round(mode_base * GST_RATE, 2):>8.2f}")
-            content.append(f"{'Total (incl GST)':<56} {mode_incl:>8.2f}")
-            content.append("")
-
-        content.append("-" * 67)
-        content.append(f"{'Grand Total (incl GST)':<56} {grand_total:>8.2f}")
-
-        text_content = "\n".join(content)
-        text.insert(tk.END, text_content)
-        text.config(state=tk.DISABLED)
+    def preview_estimate(self):
+        if not self.estimate.lines:
+            return messagebox.showerror("Error", "No items in estimate")
+        # Another terminal may save first and take this number, so it is marked as such
+        estimate_no = f"{self.engine.next_estimate_no()} (provisional)"
+        key, text_content = self.engine.render_receipt(estimate_no, self.engine.today_str(),
+                                                       self.estimate.receipt_lines(), self.payment_mode.get())
+        self.show_text_window("Estimate Preview", text_content, "Estimate Preview", receipt_key=key)
 
-        button_frame = tk.Frame(p)
-        button_frame.pack(fill=tk.X, padx=10, pady=10)
-        tk.Button(button_frame, text="Print", command=lambda: self.print_text_content(text_content, "Detailed Sales Report")).pack(side=tk.LEFT, padx=8)
-        p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
+    def generate_estimate_action(self):
+        if not self.estimate.lines:
+            return messagebox.showerror("Error", "No items in estimate")
+        estimate = self.estimate
+        estimate.payment_mode = self.payment_mode.get()
+        date_str = self.engine.today_str()
+        try:
+            self.engine.commit_estimate(estimate, date_str)
+        except sqlite3.Error as e:
+            return messagebox.showerror("Error", f"Could not save estimate: {e}")
+        self.engine.note_write()
 
-    def show_cancelled_estimates_report(self):
-        t = self.today_str()
-        p = tk.Toplevel(self.root)
-        p.title("Cancelled Estimates Report")
-        p.geometry("600x400")
-        p.grab_set()
-        self.unbind_shortcuts()
+        key, text_content = self.engine.render_receipt(estimate.estimate_no, date_str,
+                                                       estimate.receipt_lines(), estimate.payment_mode)
+        self.print_text_content(text_content, f"Estimate {estimate.estimate_no}", key,
+                                open_drawer=estimate.payment_mode == "Cash")
 
-        text = Text(p, wrap=tk.WORD, font=("Courier", 10))
-        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        scrollbar = tk.Scrollbar(p, orient=tk.VERTICAL, command=text.yview)
+        self.estimate = self.engine.new_estimate()
+        self.refresh_table()
+        self.estimate_label.config(text="Estimate No: ")
+        self.update_today_total()
+
+    def show_daily_sales_report(self, date_from=None, date_to=None):
+        self.show_report_window("Daily Sales Report", "daily_sales_report_lines", (date_from, date_to),
+                                "Daily Sales Report")
+
+    def show_detailed_sales_report(self, date_from=None, date_to=None):
+        self.show_report_window("Detailed Sales Report", "detailed_sales_report_lines", (date_from, date_to),
+                                "Detailed Sales Report", geometry="800x600")
+
+    def show_cancelled_estimates_report(self, date_from=None, date_to=None):
+        self.show_report_window("Cancelled Estimates Report", "cancelled_estimates_report_lines", (date_from, date_to),
+                                "Cancelled Estimates Report")
+
+    def show_monthly_sales_report(self, date_from=None, date_to=None):
+        self.show_report_window("Month-by-Month Sales", "monthly_sales_report_lines", (date_from, date_to),
+                                "Month-by-Month Sales")
+
+    def show_yearly_sales_report(self):
+        self.show_report_window("Year-over-Year Sales", "yearly_sales_report_lines", (), "Year-over-Year Sales")
+
+    def show_terminal_totals_report(self, date_from=None, date_to=None):
+        self.show_report_window("Terminal Totals", "terminal_totals_report_lines", (date_from, date_to),
+                                "Terminal Totals")
+
+    def export_estimates(self, date_from, date_to):
+        path = filedialog.asksaveasfilename(
+            title="Export Estimates", initialdir="../reports", initialfile=f"estimates_{date_from}_{date_to}.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("CSV (gzip)", "*.csv.gz"), ("JSON Lines", "*.jsonl"),
+                       ("JSON Lines (gzip)", "*.jsonl.gz")])
+        if not path:
+            return
+
+        def on_result(kind, value):
+            if kind == "error":
+                messagebox.showerror("Error", f"Export failed: {value}")
+            elif kind == "done":
+                messagebox.showinfo("Export", f"Exported {value} lines to {path}")
+
+        # Written by the report worker so a long range does not hold up the counter
+        job = self.report_worker.submit_call("export_estimates", path, date_from, date_to)
+        self.report_jobs[job] = on_result
+
+    def build_estimate_list(self, p, active_only):
+        # Estimate headers newest first, fetched a page at a time (keyset on id)
+        # as the list is scrolled towards its end.
+        filter_frame = tk.Frame(p)
+        filter_frame.pack(fill=tk.X, padx=8, pady=(8, 0))
+        tk.Label(filter_frame, text="Date (YYYY-MM-DD)").pack(side=tk.LEFT)
+        date_var = tk.StringVar()
+        date_entry = tk.Entry(filter_frame, textvariable=date_var, width=12)
+        date_entry.pack(side=tk.LEFT, padx=4)
+        tk.Label(filter_frame, text="Estimate No").pack(side=tk.LEFT, padx=(12, 0))
+        number_var = tk.StringVar()
+        number_entry = tk.Entry(filter_frame, textvariable=number_var, width=16)
+        number_entry.pack(side=tk.LEFT, padx=4)
+
+        list_frame = tk.Frame(p)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
+        cols = ("Estimate No", "Date", "Total")
+        tree = ttk.Treeview(list_frame, columns=cols, show="headings", height=12)
+        for ccol in cols:
+            tree.heading(ccol, text=ccol)
+            tree.column(ccol, width=160 if ccol != "Total" else 120, anchor=tk.CENTER)
+        scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL, command=tree.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        text.config(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        content = []
-        content.append("Cancelled Estimates Report")
-        content.append(f"Date: {t}")
-        content.append("-" * 42)
-        content.append(f"{'Estimate No':<20} {'Amount':>8}")
-        content.append("-" * 42)
-
-        self.c.execute("""SELECT estimate_no, SUM(total) as s
-                          FROM estimates
-                          WHERE date=? AND status='Cancelled'
-                          GROUP BY estimate_no
-                          ORDER BY estimate_no""", (t,))
-        tot = 0.0
-        for est, s in self.c.fetchall():
-            content.append(f"{est:<20} {(s or 0):>8.2f}")
-            tot += float(s or 0)
-        content.append("-" * 42)
-        content.append(f"{'Total Cancelled':<20} {tot:>8.2f}")
-
-        text_content = "\n".join(content)
-        text.insert(tk.END, text_content)
-        text.config(state=tk.DISABLED)
+        state = {"before_id": None, "date": None, "done": False}
 
-        button_frame = tk.Frame(p)
-        button_frame.pack(fill=tk.X, padx=10, pady=10)
-        tk.Button(button_frame, text="Print", command=lambda: self.print_text_content(text_content, "Cancelled Estimates Report")).pack(side=tk.LEFT, padx=8)
-        p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
+        def load_page():
+            if state["done"]:
+                return
+            rows = self.engine.estimate_page(active_only, state["date"], state["before_id"])
+            for master_id, *row in rows:
+                tree.insert("", "end", iid=str(master_id), values=row)
+            if rows:
+                state["before_id"] = rows[-1][0]
+            state["done"] = len(rows) < ESTIMATE_PAGE_SIZE
+
+        def reload(start_id=None):
+            date = date_var.get().strip()
+            if date:
+                try:
+                    datetime.datetime.strptime(date, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showerror("Error", "Date must be in YYYY-MM-DD format")
+                    return
+            tree.delete(*tree.get_children())
+            state.update(before_id=None if start_id is None else start_id + 1, date=date or None, done=False)
+            load_page()
+
+        def jump_to_number(event=None):
+            number = number_var.get().strip()
+            if not number:
+                return reload()
+            master_id = self.engine.find_estimate_id(number, active_only)
+            if master_id is None:
+                messagebox.showerror("Error", f"Estimate {number} not found")
+                return
+            date_var.set("")
+            reload(start_id=master_id)
+            tree.selection_set(str(master_id))
+            tree.see(str(master_id))
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.95 and not state["done"]:
+                load_page()
+
+        tree.configure(yscrollcommand=on_scroll)
+        date_entry.bind("<Return>", lambda e: reload())
+        number_entry.bind("<Return>", jump_to_number)
+        tk.Button(filter_frame, text="Go", command=lambda: jump_to_number() if number_var.get().strip() else reload(),
+                  width=6).pack(side=tk.LEFT, padx=4)
+        load_page()
+        return tree
 
     def view_estimates(self):
         p = tk.Toplevel(self.root)
@@ -700,82 +1015,27 @@ class BillingApp:
         p.grab_set()
         self.unbind_shortcuts()
 
-        cols = ("Estimate No", "Date", "Total")
-        tree = ttk.Treeview(p, columns=cols, show="headings", height=12)
-        for ccol in cols:
-            tree.heading(ccol, text=ccol)
-            tree.column(ccol, width=160 if ccol != "Total" else 120, anchor=tk.CENTER)
-        tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
-
-        self.c.execute("""SELECT estimate_no, date, SUM(total) AS s
-                          FROM estimates
-                          GROUP BY estimate_no, date
-                          ORDER BY date, estimate_no""")
-        for row in self.c.fetchall():
-            tree.insert("", "end", values=row)
+        tree = self.build_estimate_list(p, active_only=False)
 
         def show_selected(event=None):
             sel = tree.selection()
             if not sel:
                 return
-            est = tree.item(sel[0], "values")[0]
-            self.show_estimate_details(est)
+            self.show_estimate_details(int(sel[0]))
 
         tree.bind("<Double-1>", show_selected)
         tk.Button(p, text="View Selected", command=show_selected, width=16).pack(side=tk.RIGHT, padx=8, pady=6)
         p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
 
-    def show_estimate_details(self, estimate_no):
-        self.c.execute("""SELECT date, description, qty, unit_price, total, payment_mode
-                          FROM estimates
-                          WHERE estimate_no=? AND status='Active'""", (estimate_no,))
-        rows = self.c.fetchall()
-        if not rows:
+    def show_estimate_details(self, master_id):
+        details = self.engine.estimate_details(master_id)
+        if not details or details[0][3] != 'Active':
+            estimate_no = details[0][0] if details else master_id
             messagebox.showerror("Error", f"No details found for estimate {estimate_no}")
             return
-
-        p = tk.Toplevel(self.root)
-        p.title(f"Estimate {estimate_no}")
-        p.geometry("600x400")
-        p.grab_set()
-        self.unbind_shortcuts()
-
-        text = Text(p, wrap=tk.WORD, font=("Courier", 10))
-        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        scrollbar = tk.Scrollbar(p, orient=tk.VERTICAL, command=text.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        text.config(yscrollcommand=scrollbar.set)
-
-        content = []
-        content.append("BBK Software Solutions")
-        content.append("-" * 42)
-        content.append(f"Estimate: {estimate_no:<20}")
-        content.append(f"Date: {rows[0][0]:<20}")
-        content.append("")
-        content.append(f"{'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}")
-        content.append("-" * 42)
-
-        total = 0.0
-        for _, desc, qty, rate, total_line, payment_mode in rows:
-            name = DISPLAY_NAME.get(desc, desc)[:20]
-            content.append(f"{name:<20} {qty:>8.2f} {rate:>8.2f} {total_line:>8.2f}")
-            total += float(total_line or 0)
-
-        total_incl = round(total * (1 + GST_RATE), 2)
-        content.append("-" * 42)
-        content.append(f"{'Subtotal':<36} {total:>8.2f}")
-        content.append(f"{'GST (5%)':<36} {round(total * GST_RATE, 2):>8.2f}")
-        content.append(f"{'TOTAL':<36} {total_incl:>8.2f}")
-        content.append(f"{'Mode':<36} {payment_mode:>8}")
-
-        text_content = "\n".join(content)
-        text.insert(tk.END, text_content)
-        text.config(state=tk.DISABLED)
-
-        button_frame = tk.Frame(p)
-        button_frame.pack(fill=tk.X, padx=10, pady=10)
-        tk.Button(button_frame, text="Print", command=lambda: self.print_text_content(text_content, f"Estimate {estimate_no}")).pack(side=tk.LEFT, padx=8)
-        p.protocol("WM_DELETE_WINDOW", lambda: (p.destroy(), self.bind_shortcuts()))
+        (estimate_no, est_date, payment_mode, _), rows = details
+        key, text_content = self.engine.render_receipt(estimate_no, est_date, rows, payment_mode)
+        self.show_text_window(f"Estimate {estimate_no}", text_content, f"Estimate {estimate_no}", receipt_key=key)
 
     def cancel_estimate_popup(self):
         p = tk.Toplevel(self.root)
@@ -784,20 +1044,7 @@ class BillingApp:
         p.grab_set()
         self.unbind_shortcuts()
 
-        cols = ("Estimate No", "Date", "Total")
-        tree = ttk.Treeview(p, columns=cols, show="headings", height=12)
-        for ccol in cols:
-            tree.heading(ccol, text=ccol)
-            tree.column(ccol, width=160 if ccol != "Total" else 120, anchor=tk.CENTER)
-        tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
-
-        self.c.execute("""SELECT estimate_no, date, SUM(total) AS s
-                          FROM estimates
-                          WHERE status='Active'
-                          GROUP BY estimate_no, date
-                          ORDER BY date, estimate_no""")
-        for row in self.c.fetchall():
-            tree.insert("", "end", values=row)
+        tree = self.build_estimate_list(p, active_only=True)
 
         def cancel_selected():
             sel = tree.selection()
@@ -806,8 +1053,14 @@ class BillingApp:
             est = tree.item(sel[0], "values")[0]
             if not messagebox.askyesno("Confirm", f"Cancel entire estimate {est}?"):
                 return
-            self.c.execute("UPDATE estimates SET status='Cancelled' WHERE estimate_no=?", (est,))
-            self.conn.commit()
+            try:
+                cancelled = self.engine.cancel_estimate(int(sel[0]))
+            except sqlite3.Error as e:
+                return messagebox.showerror("Error", f"Could not cancel estimate: {e}")
+            if not cancelled:
+                # Another terminal got there first
+                return messagebox.showerror("Error", f"Estimate {est} is already cancelled")
+            self.engine.note_write()
             messagebox.showinfo("Cancelled", f"Estimate {est} cancelled")
             p.destroy()
             self.bind_shortcuts()
@@ -821,14 +1074,30 @@ class BillingApp:
             return
         if not messagebox.askyesno("Confirm Again", "This will delete all estimate data but preserve items and shortcuts. Continue?"):
             return
+        catalog = None
         try:
-            # Ensure database connection is closed
+            # The catalog shares the database file; keep it across the erase, and
+            # in CONFIG_FILE as well in case the erase fails part way
+            catalog = self.engine.export_catalog()
+            try:
+                self.engine.save_catalog_file(CONFIG_FILE)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not back up the item catalog to '{CONFIG_FILE}': {e}")
+                return
+            # Ensure database connections are closed
             try:
-                self.conn.commit()
-                self.conn.close()
+                if not self.report_worker.close():
+                    messagebox.showerror("Error", "A report is still being prepared. Close it and try again.")
+                    return
+                if self.api is not None:
+                    if not self.api.stop():
+                        messagebox.showerror("Error", "The API server did not stop. Try again.")
+                        return
+                    self.api = None
+                self.engine.close()
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to close database connection: {e}")
-                return
+                return self.reopen_database(catalog)
 
             # Remove hidden attribute on Windows
             if platform.system() == "Windows" and os.path.exists(DB_FILE):
@@ -850,19 +1119,22 @@ class BillingApp:
                         file.write(b'\0' * file_size)
                     # Delete the file
                     os.remove(DB_FILE)
+                    # WAL mode sidecar files, normally removed when the connection closes
+                    for suffix in ("-wal", "-shm"):
+                        if os.path.exists(DB_FILE + suffix):
+                            os.remove(DB_FILE + suffix)
                 except PermissionError as e:
                     messagebox.showerror("Error", f"Permission denied while modifying/deleting database file: {e}\nEnsure the file is not in use and you have write permissions.")
-                    return
+                    return self.reopen_database(catalog)
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to securely delete database file: {e}")
-                    return
+                    return self.reopen_database(catalog)
 
             # Reinitialize database
-            self.conn = sqlite3.connect(DB_FILE)
-            self.c = self.conn.cursor()
-            self.setup_database()
-            self.items.clear()
-            self.current_estimate_no = None
+            self.open_database()
+            self.engine.import_catalog(catalog)
+            self.start_api()
+            self.estimate = self.engine.new_estimate()
             self.refresh_table()
             self.estimate_label.config(text="Estimate No: ")
             self.update_today_total()
@@ -870,18 +1142,46 @@ class BillingApp:
         except Exception as e:
             messagebox.showerror("Error", f"Unexpected error: {e}")
             # Reopen connection if it was closed but setup failed
-            self.conn = sqlite3.connect(DB_FILE)
-            self.c = self.conn.cursor()
-            self.setup_database()
+            self.reopen_database(catalog)
+
+    def reopen_database(self, catalog):
+        # After a failed erase: reopen, and put the catalog back if it went with the data
+        try:
+            self.open_database()
+            if catalog and self.engine.catalog_is_empty():
+                self.engine.import_catalog(catalog)
+            if self.api is None:
+                self.start_api()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not reopen the database: {e}\n"
+                                          f"The item catalog is saved in '{CONFIG_FILE}'.")
+
+    def update_today_total(self, recompute=False):
+        incl = self.engine.today_total(recompute)
+        text = f"Today's Sales Total: {incl:.2f}"
+        if MULTI_TERMINAL:
+            text += f"   {TERMINAL_ID}: {self.engine.terminal_today_total():.2f}"
+        self.today_total_label.config(text=text)
+
+    def check_day_rollover(self):
+        self.update_today_total()
+        self.root.after(TOTAL_REFRESH_MS, self.check_day_rollover)
+
+def warm_imports():
+    # Load the PDF libraries in the background once the window is up, so the
+    # first print does not pay for the import.
+    try:
+        import reportlab.pdfgen.canvas  # noqa: F401
+        import reportlab.lib.units  # noqa: F401
+    except ImportError:
+        pass
 
-    def update_today_total(self):
-        t = self.today_str()
-        self.c.execute("SELECT SUM(total) FROM estimates WHERE date=? AND status='Active'", (t,))
-        base = float(self.c.fetchone()[0] or 0.0)
-        incl = round(base * (1 + GST_RATE), 2)
-        self.today_total_label.config(text=f"Today's Sales Total: {incl:.2f}")
+def startup_complete():
+    print(f"Startup time: {(time.perf_counter() - STARTUP_STARTED) * 1000:.0f} ms", file=sys.stderr)
+    threading.Thread(target=warm_imports, name="warm-imports", daemon=True).start()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = BillingApp(root)
+    root.after_idle(startup_complete)
     root.mainloop()
\ No newline at end of file
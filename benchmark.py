@@ -0,0 +1,275 @@
+# Benchmarks the BillingEngine operations behind the billing screens against
+# synthetic databases of several sizes, and writes the timings as JSON.
+#
+#   python benchmark.py --sizes 10k,1m --output bench.json
+#   python benchmark.py --sizes 10k --compare bench.json
+#
+# Generated databases are cached in --data-dir and reused by later runs; every
+# run works on a fresh copy so the timed writes never accumulate.
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from billing_engine import BillingEngine, GST_RATE, ESTIMATE_PREFIX
+
+# (item, typical qty, typical rate, weight) for the synthetic item mix
+SYNTHETIC_ITEMS = [
+    ("Soya Oil", 5, 135.0, 30),
+    ("Palm Oil", 5, 110.0, 25),
+    ("Sunflower Oil", 2, 160.0, 12),
+    ("Groundnut Oil", 2, 190.0, 10),
+    ("Mustard Oil", 2, 170.0, 8),
+    ("Cottonseed Oil", 5, 125.0, 5),
+    ("Rice Bran Oil", 2, 150.0, 4),
+    ("Coconut Oil", 1, 240.0, 3),
+    ("Sesame Oil", 1, 280.0, 1),
+    ("Vanaspati", 2, 140.0, 2),
+]
+PAYMENT_MODE_WEIGHTS = [("Cash", 75), ("Credit", 25)]
+CANCEL_RATE = 0.02
+LINES_PER_ESTIMATE = (1, 4)
+LINES_PER_DAY = 400
+DEFAULT_REPEAT = 20
+REGRESSION_THRESHOLD = 1.25  # --compare flags operations this much slower
+
+
+class BenchEngine(BillingEngine):
+    # Pins "today" to the last generated day so the today-based operations
+    # always hit a full day of data.
+    def __init__(self, db_file, today):
+        self.bench_today = today
+        super().__init__(db_file)
+
+    def today_str(self):
+        return self.bench_today
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    factor = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def size_label(lines):
+    if lines >= 1000000 and lines % 1000000 == 0:
+        return f"{lines // 1000000}m"
+    if lines >= 1000 and lines % 1000 == 0:
+        return f"{lines // 1000}k"
+    return str(lines)
+
+
+def generate_database(path, lines, seed, last_day):
+    rng = random.Random(seed)
+    items = [item[:3] for item in SYNTHETIC_ITEMS]
+    item_weights = [item[3] for item in SYNTHETIC_ITEMS]
+    modes = [mode for mode, _ in PAYMENT_MODE_WEIGHTS]
+    mode_weights = [weight for _, weight in PAYMENT_MODE_WEIGHTS]
+
+    engine = BillingEngine(path, storage_profile="fast")
+    conn, c = engine.conn, engine.c
+    c.execute("PRAGMA synchronous=OFF")
+
+    days = max(1, lines // LINES_PER_DAY)
+    day = datetime.date.fromisoformat(last_day) - datetime.timedelta(days=days - 1)
+    master_id = 0
+    written = 0
+    headers, line_rows = [], []
+
+    def flush():
+        c.execute("BEGIN")
+        c.executemany("""INSERT INTO estimate_master
+                         (id,estimate_no,date,payment_mode,status,subtotal,gst,total)
+                         VALUES (?,?,?,?,?,?,?,?)""", headers)
+        c.executemany("""INSERT INTO estimates
+                         (master_id,estimate_no,date,description,qty,unit_price,total,payment_mode,status)
+                         VALUES (?,?,?,?,?,?,?,?,?)""", line_rows)
+        conn.commit()
+        headers.clear()
+        line_rows.clear()
+
+    while written < lines:
+        date_str = day.isoformat()
+        day_lines = 0
+        while day_lines < LINES_PER_DAY and written < lines:
+            master_id += 1
+            estimate_no = f"{ESTIMATE_PREFIX}/{day.year}/{master_id:04d}"
+            mode = rng.choices(modes, mode_weights)[0]
+            status = "Cancelled" if rng.random() < CANCEL_RATE else "Active"
+            count = min(rng.randint(*LINES_PER_ESTIMATE), lines - written)
+            subtotal = 0.0
+            for desc, qty, rate in rng.choices(items, item_weights, k=count):
+                qty = float(max(1, round(rng.gauss(qty, qty / 2))))
+                rate = round(rate * rng.uniform(0.95, 1.05), 2)
+                total = round(qty * rate, 2)
+                subtotal += total
+                line_rows.append((master_id, estimate_no, date_str, desc, qty, rate, total, mode, status))
+            subtotal = round(subtotal, 2)
+            headers.append((master_id, estimate_no, date_str, mode, status, subtotal,
+                            round(subtotal * GST_RATE, 2), round(subtotal * (1 + GST_RATE), 2)))
+            written += count
+            day_lines += count
+            if len(line_rows) >= 50000:
+                flush()
+        day += datetime.timedelta(days=1)
+    flush()
+    engine.sync_estimate_sequence()
+    c.execute("ANALYZE")
+    engine.close()
+    return (day - datetime.timedelta(days=1)).isoformat()
+
+
+def prepare_database(data_dir, lines, seed):
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench_{size_label(lines)}_seed{seed}.db")
+    meta_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return path, json.load(f)["last_day"]
+    for suffix in ("", "-wal", "-shm", ".json"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    print(f"Generating {size_label(lines)} line database in {path} ...", file=sys.stderr)
+    started = time.perf_counter()
+    last_day = generate_database(path, lines, seed, datetime.date.today().isoformat())
+    print(f"  done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    with open(meta_path, "w") as f:
+        json.dump({"lines": lines, "seed": seed, "last_day": last_day}, f)
+    return path, last_day
+
+
+def time_operation(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.mean(samples), 4),
+        "max_ms": round(max(samples), 4),
+    }
+
+
+def benchmark_operations(engine, rng):
+    # name -> callable; names follow the BillingApp methods they stand in for
+    def generate_estimate_action():
+        estimate = engine.new_estimate(rng.choice(["Cash", "Credit"]))
+        for desc, qty, rate, _ in rng.sample(SYNTHETIC_ITEMS, 3):
+            estimate.add_line(desc, float(qty), rate)
+        engine.commit_estimate(estimate)
+
+    def cancel_selected():
+        row = engine.estimate_page(active_only=True, limit=1)
+        if row:
+            engine.cancel_estimate(row[0][0])
+
+    return {
+        "generate_estimate_action": generate_estimate_action,
+        "update_today_total": lambda: engine.today_total(recompute=True),
+        "next_estimate_no": engine.next_estimate_no,
+        "show_daily_sales_report": engine.daily_sales_report,
+        "show_detailed_sales_report": engine.detailed_sales_report,
+        "show_cancelled_estimates_report": engine.cancelled_estimates_report,
+        "show_monthly_sales_report": engine.monthly_sales_report,
+        "show_yearly_sales_report": engine.yearly_sales_report,
+        "view_estimates": lambda: engine.estimate_page(active_only=False),
+        "cancel_estimate_popup": lambda: engine.estimate_page(active_only=True),
+        "cancel_selected": cancel_selected,
+    }
+
+
+def run_size(data_dir, lines, seed, repeat, operations):
+    source, last_day = prepare_database(data_dir, lines, seed)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_db = os.path.join(work_dir, "bench.db")
+        shutil.copyfile(source, work_db)
+        engine = BenchEngine(work_db, last_day)
+        rng = random.Random(seed)
+        for name, func in benchmark_operations(engine, rng).items():
+            if operations and name not in operations:
+                continue
+            func()  # warm the page cache and statement cache
+            stats = time_operation(func, repeat)
+            results.append({"size": size_label(lines), "lines": lines, "operation": name, **stats})
+            print(f"{size_label(lines):>5} {name:<34} median {stats['median_ms']:>10.3f} ms", file=sys.stderr)
+        engine.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {(r["size"], r["operation"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["size"], r["operation"]))
+        if not old or not old["median_ms"]:
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        flag = "  REGRESSION" if ratio >= threshold else ""
+        regressions += bool(flag)
+        print(f"{r['size']:>5} {r['operation']:<34} {old['median_ms']:>10.3f} -> {r['median_ms']:>10.3f} ms"
+              f" ({ratio:.2f}x){flag}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark billing database operations.")
+    parser.add_argument("--sizes", default="10k", help="comma-separated line counts, e.g. 10k,1m,10m")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per operation")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the synthetic data")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "billing_bench"),
+                        help="where generated databases are cached")
+    parser.add_argument("--operation", action="append", help="only run this operation (repeatable)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="median slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes.split(","):
+        results.extend(run_size(args.data_dir, parse_size(size), args.seed, args.repeat, args.operation))
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# Local HTTP/JSON API over the billing database, for kiosks and weighing scales.
+# Runs on asyncio with no dependencies beyond the standard library, either on
+# its own (billing_cli.py serve) or on a background thread next to the Tk app.
+#
+#   POST /estimates                 {"payment_mode": "Cash",
+#                                    "lines": [{"item": "Soya Oil", "qty": 2, "rate": 135.0}]}
+#                                   rate may be left out for catalog items
+#   GET  /estimates/<id>
+#   GET  /estimates?number=abc/2026/0001
+#   POST /estimates/<id>/cancel
+#   POST /estimates/cancel?number=abc/2026/0001
+#   GET  /reports/daily|detailed|cancelled?from=YYYY-MM-DD&to=YYYY-MM-DD
+#
+# All writes go through one writer thread with its own connection, so they are
+# serialised; lookups and reports use a separate reader thread and a read-only
+# connection.
+import asyncio
+import datetime
+import json
+import math
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from billing_engine import BillingEngine, DB_FILE, PAYMENT_MODES, TERMINAL_ID
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+MAX_BODY_SIZE = 1024 * 1024
+STOP_TIMEOUT = 10  # Seconds ApiThread.stop() waits for the server thread
+REPORTS = ("daily", "detailed", "cancelled")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class EngineThread:
+    # A single worker thread owning one BillingEngine; calls run in submission order.
+    # The engine is opened before the constructor returns.
+    def __init__(self, db_file, terminal_id, read_only=False):
+        self.engine = None
+        self.executor = ThreadPoolExecutor(max_workers=1, initializer=self.open,
+                                           initargs=(db_file, terminal_id, read_only))
+        self.executor.submit(lambda: None).result()
+
+    def open(self, db_file, terminal_id, read_only):
+        self.engine = BillingEngine(db_file, terminal_id=terminal_id, read_only=read_only)
+        # Report text uses the catalog display names, as in the app
+        self.engine.display_names.update(self.engine.export_catalog()["display_names"])
+
+    async def call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: func(self.engine, *args))
+
+    def close(self):
+        self.executor.submit(lambda: self.engine and self.engine.close()).result()
+        self.executor.shutdown()
+
+
+def estimate_json(engine, master_id):
+    details = engine.estimate_details(master_id)
+    if details is None:
+        return None
+    (estimate_no, date, payment_mode, status), lines = details
+    return {
+        "id": master_id, "estimate_no": estimate_no, "date": date, "payment_mode": payment_mode, "status": status,
+        "lines": [{"item": desc, "qty": qty, "rate": rate, "total": total} for desc, qty, rate, total in lines],
+        "subtotal": round(sum(float(line[3] or 0) for line in lines), 2),
+    }
+
+
+def create_estimate(engine, payment_mode, lines):
+    estimate = engine.new_estimate(payment_mode)
+    for line in lines:
+        rate = line["rate"]
+        if rate is None:
+            engine.c.execute("SELECT rate FROM items WHERE name=?", (line["item"],))
+            row = engine.c.fetchone()
+            if row is None:
+                raise ApiError(400, f"No rate given for unknown item {line['item']!r}")
+            rate = row[0]
+        estimate.add_line(line["item"], line["qty"], float(rate))
+    master_id = engine.commit_estimate(estimate)
+    return {"id": master_id, "estimate_no": estimate.estimate_no, "date": engine.today_str(),
+            "payment_mode": payment_mode, "subtotal": estimate.subtotal, "gst": estimate.gst, "total": estimate.total}
+
+
+def cancel_estimate(engine, master_id=None, estimate_no=None):
+    if master_id is None:
+        master_id = engine.find_estimate_id(estimate_no)
+    if master_id is None or engine.estimate_details(master_id) is None:
+        raise ApiError(404, "Estimate not found")
+    if not engine.cancel_estimate(master_id):
+        raise ApiError(409, "Estimate is already cancelled")
+    return {"id": master_id, "status": "Cancelled"}
+
+
+def find_estimate(engine, master_id=None, estimate_no=None):
+    if master_id is None:
+        master_id = engine.find_estimate_id(estimate_no)
+    result = estimate_json(engine, master_id) if master_id is not None else None
+    if result is None:
+        raise ApiError(404, "Estimate not found")
+    return result
+
+
+def report(engine, name, date_from, date_to):
+    date_from, date_to = engine.report_range(date_from, date_to)
+    if name == "daily":
+        rows = [{"payment_mode": mode, "item": desc, "qty": qty, "amount": amount}
+                for mode in PAYMENT_MODES for desc, qty, amount in engine.daily_sales_rows(date_from, date_to, mode)]
+        text = engine.daily_sales_report(date_from, date_to)
+    elif name == "detailed":
+        rows = [{"payment_mode": mode, "estimate_no": no, "item": desc, "qty": qty, "rate": rate, "total": total}
+                for mode in PAYMENT_MODES
+                for no, desc, qty, rate, total in engine.detailed_sales_rows(date_from, date_to, mode)]
+        text = engine.detailed_sales_report(date_from, date_to)
+    else:
+        rows = [{"estimate_no": no, "subtotal": subtotal}
+                for no, subtotal in engine.cancelled_estimate_rows(date_from, date_to)]
+        text = engine.cancelled_estimates_report(date_from, date_to)
+    return {"report": name, "from": date_from, "to": date_to, "rows": rows, "text": text}
+
+
+def parse_lines(body):
+    if not isinstance(body, dict):
+        raise ApiError(400, "Expected a JSON object")
+    payment_mode = body.get("payment_mode", "Cash")
+    if payment_mode not in PAYMENT_MODES:
+        raise ApiError(400, f"payment_mode must be one of {', '.join(PAYMENT_MODES)}")
+    lines = body.get("lines")
+    if not isinstance(lines, list) or not lines:
+        raise ApiError(400, "lines must be a non-empty list")
+    parsed = []
+    for line in lines:
+        try:
+            item = str(line["item"]).strip()
+            qty = float(line["qty"])
+            rate = None if line.get("rate") is None else float(line["rate"])
+        except (KeyError, TypeError, ValueError):
+            raise ApiError(400, "Each line needs an item, a numeric qty and optionally a numeric rate")
+        if not math.isfinite(qty) or (rate is not None and not math.isfinite(rate)):
+            raise ApiError(400, "qty and rate must be finite numbers")
+        if not item or qty <= 0 or (rate is not None and rate < 0):
+            raise ApiError(400, "Each line needs an item name, a positive qty and a non-negative rate")
+        parsed.append({"item": item, "qty": qty, "rate": rate})
+    return payment_mode, parsed
+
+
+def parse_date(query, name):
+    value = query.get(name, [None])[0]
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise ApiError(400, f"{name} must be a YYYY-MM-DD date")
+
+
+class BillingApi:
+    def __init__(self, db_file=DB_FILE, terminal_id=f"{TERMINAL_ID}-api"):
+        self.writer = EngineThread(db_file, terminal_id)  # creates and migrates the database
+        self.reader = EngineThread(db_file, terminal_id, read_only=True)
+
+    def close(self):
+        self.writer.close()
+        self.reader.close()
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        query = parse_qs(url.query)
+        number = query.get("number", [None])[0]
+
+        if parts == ["estimates"]:
+            if method == "POST":
+                return 201, await self.writer.call(create_estimate, *parse_lines(body))
+            if method == "GET":
+                if not number:
+                    raise ApiError(400, "number is required")
+                return 200, await self.reader.call(find_estimate, None, number)
+        elif len(parts) == 2 and parts[0] == "estimates" and parts[1].isdigit():
+            if method == "GET":
+                return 200, await self.reader.call(find_estimate, int(parts[1]))
+        elif parts == ["estimates", "cancel"]:
+            if method == "POST":
+                if not number:
+                    raise ApiError(400, "number is required")
+                return 200, await self.writer.call(cancel_estimate, None, number)
+        elif len(parts) == 3 and parts[0] == "estimates" and parts[1].isdigit() and parts[2] == "cancel":
+            if method == "POST":
+                return 200, await self.writer.call(cancel_estimate, int(parts[1]))
+        elif len(parts) == 2 and parts[0] == "reports" and parts[1] in REPORTS:
+            if method == "GET":
+                return 200, await self.reader.call(report, parts[1], parse_date(query, "from"), parse_date(query, "to"))
+        else:
+            raise ApiError(404, "Not found")
+        raise ApiError(405, "Method not allowed")
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive; one request at a time per connection.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() != "HTTP/1.0")
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, {"error": "Invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.respond(writer, 413, {"error": "Request body too large"}, False)
+                    break
+                raw = await reader.readexactly(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                except json.JSONDecodeError:
+                    status, payload = 400, {"error": "Body is not valid JSON"}
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except sqlite3.OperationalError as e:
+                    status, payload = 503, {"error": f"Database busy: {e}"}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # client went away, or the server is stopping
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                     "Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def serve(self, host=API_HOST, port=API_PORT, started=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if started:
+            started(server)
+        async with server:
+            await server.serve_forever()
+
+
+def run(db_file=DB_FILE, host=API_HOST, port=API_PORT, terminal_id=f"{TERMINAL_ID}-api"):
+    api = BillingApi(db_file, terminal_id)
+    try:
+        asyncio.run(api.serve(host, port))
+    finally:
+        api.close()
+
+
+class ApiThread:
+    # Serves from a daemon thread with its own event loop, e.g. next to the Tk window.
+    # stop() shuts the server down and closes its database connections.
+    def __init__(self, db_file, host, port, terminal_id):
+        self.loop = None
+        self.server = None
+        self.ready = threading.Event()  # set once serving, or once the thread has given up
+        self.thread = threading.Thread(target=self.run, args=(db_file, host, port, terminal_id),
+                                       name="billing-api", daemon=True)
+        self.thread.start()
+
+    def run(self, db_file, host, port, terminal_id):
+        try:
+            api = BillingApi(db_file, terminal_id)
+            try:
+                asyncio.run(api.serve(host, port, self.started))
+            except asyncio.CancelledError:
+                pass  # stopped
+            finally:
+                api.close()
+        finally:
+            self.ready.set()
+
+    def started(self, server):
+        self.loop = asyncio.get_running_loop()
+        self.server = server
+        self.ready.set()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        # Returns False if the thread is still running after timeout seconds
+        self.ready.wait(timeout)
+        if self.server is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.server.close)
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+def start_in_thread(db_file=DB_FILE, host=API_HOST, port=API_PORT, terminal_id=f"{TERMINAL_ID}-api"):
+    return ApiThread(db_file, host, port, terminal_id)
@@ -0,0 +1,129 @@
+# Command-line access to the billing database without the Tk app.
+#
+#   python billing_cli.py export sales.csv.gz --period "This Financial Year"
+#   python billing_cli.py export april.jsonl --from 2026-04-01 --to 2026-04-30
+#   python billing_cli.py import-legacy ../billing_data.db
+#   python billing_cli.py catalog-export items.json
+#   python billing_cli.py serve --port 8765
+import argparse
+import datetime
+import sys
+
+from billing_engine import BillingEngine, DB_FILE, EXPORT_FORMATS, REPORT_PERIODS, period_range
+import billing_api
+from legacy_import import LEGACY_BATCH_SIZE, LEGACY_DB_FILE, LegacyImportError, import_legacy
+
+
+def parse_date(text):
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {text!r}, expected YYYY-MM-DD")
+
+
+def resolve_range(args):
+    if args.period:
+        return period_range(args.period)
+    date_from = args.date_from or datetime.date.today().isoformat()
+    date_to = args.date_to or date_from
+    if date_from > date_to:
+        sys.exit("error: --from is after --to")
+    return date_from, date_to
+
+
+def add_range_arguments(parser):
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="first date, YYYY-MM-DD (default today)")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="last date, YYYY-MM-DD (default --from)")
+    parser.add_argument("--period", choices=REPORT_PERIODS, help="preset period instead of --from/--to")
+
+
+def cmd_export(args):
+    date_from, date_to = resolve_range(args)
+    engine = BillingEngine(args.db)
+    try:
+        count = engine.export_estimates(args.output, date_from, date_to, args.format, args.gzip or None)
+    finally:
+        engine.close()
+    print(f"Exported {count} lines from {date_from} to {date_to} to {args.output}", file=sys.stderr)
+
+
+def cmd_import_legacy(args):
+    def progress(done, total):
+        print(f"\rImported {done}/{total} lines ({done * 100 // max(total, 1)}%)", end="", file=sys.stderr)
+
+    engine = BillingEngine(args.db)
+    try:
+        invoices, lines = import_legacy(engine, args.legacy_db, args.batch_size, progress)
+    except LegacyImportError as e:
+        sys.exit(f"error: {e}")
+    finally:
+        engine.close()
+    print(f"\nImported {invoices} invoices ({lines} lines) from {args.legacy_db}", file=sys.stderr)
+
+
+def cmd_catalog_import(args):
+    engine = BillingEngine(args.db)
+    try:
+        engine.load_catalog_file(args.file)
+        count = len(engine.export_catalog()["items"])
+    finally:
+        engine.close()
+    print(f"Imported {count} items from {args.file}", file=sys.stderr)
+
+
+def cmd_catalog_export(args):
+    engine = BillingEngine(args.db)
+    try:
+        engine.save_catalog_file(args.file)
+    finally:
+        engine.close()
+    print(f"Exported the item catalog to {args.file}", file=sys.stderr)
+
+
+def cmd_serve(args):
+    print(f"Serving the billing API on http://{args.host}:{args.port}/", file=sys.stderr)
+    try:
+        billing_api.run(args.db, args.host, args.port, args.terminal_id)
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Billing database tools.")
+    parser.add_argument("--db", default=DB_FILE, help=f"database file (default {DB_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="export estimate lines to CSV or JSON Lines")
+    export.add_argument("output", help="output file; .jsonl selects JSON Lines and .gz compresses")
+    export.add_argument("--format", choices=EXPORT_FORMATS, help="override the format implied by the file name")
+    export.add_argument("--gzip", action="store_true", help="gzip the output whatever its name")
+    add_range_arguments(export)
+    export.set_defaults(func=cmd_export)
+
+    legacy = commands.add_parser("import-legacy", help="import a billing_app.py invoices database")
+    legacy.add_argument("legacy_db", nargs="?", default=LEGACY_DB_FILE,
+                        help=f"legacy database file (default {LEGACY_DB_FILE})")
+    legacy.add_argument("--batch-size", type=int, default=LEGACY_BATCH_SIZE, help="lines per transaction")
+    legacy.set_defaults(func=cmd_import_legacy)
+
+    catalog_import = commands.add_parser("catalog-import", help="replace the item catalog from a JSON config")
+    catalog_import.add_argument("file", help="items JSON in the items_config.json layout")
+    catalog_import.set_defaults(func=cmd_catalog_import)
+
+    catalog_export = commands.add_parser("catalog-export", help="write the item catalog to a JSON config")
+    catalog_export.add_argument("file", help="output JSON file")
+    catalog_export.set_defaults(func=cmd_catalog_export)
+
+    serve = commands.add_parser("serve", help="run the local HTTP/JSON API")
+    serve.add_argument("--host", default=billing_api.API_HOST, help=f"address to bind (default {billing_api.API_HOST})")
+    serve.add_argument("--port", type=int, default=billing_api.API_PORT, help=f"port (default {billing_api.API_PORT})")
+    serve.add_argument("--terminal-id", default=f"{billing_api.TERMINAL_ID}-api",
+                       help="terminal ID recorded on estimates created through the API")
+    serve.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
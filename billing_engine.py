@@ -0,0 +1,1001 @@
+import sqlite3
+import datetime
+import csv
+import gzip
+import json
+import os
+import random
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DB_FILE = "../.sys_billing"
+GST_RATE = 0.05
+ESTIMATE_PREFIX = "abc"  # Estimate numbers are {prefix}/{year}/{sequence}
+ESTIMATE_SEQ_DIGITS = 4  # Minimum sequence width; longer sequences are not truncated
+PAYMENT_MODES = ("Cash", "Credit")
+
+# SQLite journal/sync settings. "fast" keeps a write-ahead log and only syncs at
+# checkpoints; "safe" is SQLite's default rollback journal with a full fsync per commit.
+STORAGE_PROFILES = {
+    "fast": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+    "safe": {"journal_mode": "DELETE", "synchronous": "FULL"},
+}
+STORAGE_PROFILE = "fast"
+
+# Several counters sharing one database file (WAL on a local disk). A writer waits
+# up to BUSY_TIMEOUT_MS for the lock, then the save or cancel is retried with
+# exponential backoff, WRITE_RETRIES times at most.
+BUSY_TIMEOUT_MS = 5000
+WRITE_RETRIES = 5
+WRITE_RETRY_DELAY = 0.05  # Seconds before the first retry; doubled each time, with jitter
+TERMINAL_ID = "main"
+
+ESTIMATE_PAGE_SIZE = 100  # Rows fetched per page in the estimate lists
+RECEIPT_CACHE_SIZE = 64  # Rendered receipts kept for preview, print and reprint
+REPORT_FETCH_SIZE = 500  # Rows pulled from the cursor per batch while streaming a report
+REPORT_CACHE_SIZE = 16  # Rendered reports kept for reopening while the data is unchanged
+
+# Catalog written to an empty database when there is no JSON config to import
+DEFAULT_CATALOG = {
+    "items": ["Soya Oil", "Palm Oil"],
+    "display_names": {"Soya Oil": "Soya Oil", "Palm Oil": "Palm Oil"},
+    "rates": {"Soya Oil": 0.0, "Palm Oil": 0.0},
+    "shortcuts": {"1": "Soya Oil", "2": "Palm Oil"},
+}
+
+# Columns of the estimate export, one row per line with its header joined
+EXPORT_COLUMNS = ("date", "estimate_no", "payment_mode", "estimate_status", "line_status", "description",
+                  "qty", "unit_price", "line_total", "estimate_subtotal", "estimate_gst", "estimate_total")
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Report period presets, resolved against today's date by period_range()
+REPORT_PERIODS = ("Today", "This Week", "This Month", "Last Month", "This Financial Year", "Last Financial Year")
+FINANCIAL_YEAR_START_MONTH = 4  # Indian financial year, April to March
+
+# Raises each (prefix, year) sequence to the highest number already used, for
+# numbers written outside the allocator (older versions, imports).
+SEQUENCE_SYNC_SQL = """
+    INSERT INTO estimate_sequence (prefix, year, last_seq)
+        SELECT prefix, CAST(substr(rest, 1, instr(rest, '/') - 1) AS INTEGER),
+               MAX(CAST(substr(rest, instr(rest, '/') + 1) AS INTEGER))
+        FROM (SELECT substr(estimate_no, 1, instr(estimate_no, '/') - 1) AS prefix,
+                     substr(estimate_no, instr(estimate_no, '/') + 1) AS rest
+              FROM estimate_master WHERE estimate_no LIKE '%/%/%')
+        WHERE true
+        GROUP BY 1, 2
+        ON CONFLICT (prefix, year) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq);"""
+
+# Schema migrations, applied in order on startup. PRAGMA user_version holds the
+# number of migrations already applied to the database file.
+SCHEMA_MIGRATIONS = [
+    # 1: indexes for the report, today-total and estimate lookup queries
+    """CREATE INDEX IF NOT EXISTS idx_estimates_date_status_mode_desc
+           ON estimates(date, status, payment_mode, description, qty, total);
+       CREATE INDEX IF NOT EXISTS idx_estimates_estimate_no ON estimates(estimate_no);
+       CREATE INDEX IF NOT EXISTS idx_estimates_status_date ON estimates(status, date);""",
+    # 2: per-day sales summary of active lines, kept current by triggers
+    """CREATE TABLE IF NOT EXISTS daily_summary (
+           date TEXT NOT NULL,
+           payment_mode TEXT NOT NULL,
+           description TEXT NOT NULL,
+           lines INTEGER NOT NULL DEFAULT 0,
+           qty REAL NOT NULL DEFAULT 0,
+           total REAL NOT NULL DEFAULT 0,
+           PRIMARY KEY (date, payment_mode, description)
+       ) WITHOUT ROWID;
+       INSERT INTO daily_summary (date, payment_mode, description, lines, qty, total)
+           SELECT COALESCE(date, ''), COALESCE(payment_mode, ''), COALESCE(description, ''),
+                  COUNT(*), TOTAL(qty), TOTAL(total)
+           FROM estimates WHERE status='Active'
+           GROUP BY 1, 2, 3;
+       CREATE TRIGGER IF NOT EXISTS trg_estimates_summary_insert
+       AFTER INSERT ON estimates WHEN NEW.status='Active'
+       BEGIN
+           INSERT INTO daily_summary (date, payment_mode, description, lines, qty, total)
+               VALUES (COALESCE(NEW.date, ''), COALESCE(NEW.payment_mode, ''), COALESCE(NEW.description, ''),
+                       1, COALESCE(NEW.qty, 0), COALESCE(NEW.total, 0))
+               ON CONFLICT (date, payment_mode, description) DO UPDATE SET
+                   lines = lines + 1, qty = qty + excluded.qty, total = total + excluded.total;
+       END;
+       CREATE TRIGGER IF NOT EXISTS trg_estimates_summary_cancel
+       AFTER UPDATE OF status ON estimates WHEN OLD.status='Active' AND NEW.status='Cancelled'
+       BEGIN
+           UPDATE daily_summary
+               SET lines = lines - 1, qty = qty - COALESCE(OLD.qty, 0), total = total - COALESCE(OLD.total, 0)
+               WHERE date=COALESCE(OLD.date, '') AND payment_mode=COALESCE(OLD.payment_mode, '')
+                 AND description=COALESCE(OLD.description, '');
+           DELETE FROM daily_summary
+               WHERE date=COALESCE(OLD.date, '') AND payment_mode=COALESCE(OLD.payment_mode, '')
+                 AND description=COALESCE(OLD.description, '') AND lines <= 0;
+       END;""",
+    # 3: estimate_master becomes the estimate header (mode, status, stored totals) and
+    #    lines reference it by integer id. Lines keep their date/mode/status copies for
+    #    the line-level reports and the daily_summary triggers.
+    f"""ALTER TABLE estimate_master ADD COLUMN payment_mode TEXT;
+       ALTER TABLE estimate_master ADD COLUMN status TEXT DEFAULT 'Active';
+       ALTER TABLE estimate_master ADD COLUMN subtotal REAL DEFAULT 0;
+       ALTER TABLE estimate_master ADD COLUMN gst REAL DEFAULT 0;
+       ALTER TABLE estimate_master ADD COLUMN total REAL DEFAULT 0;
+       ALTER TABLE estimates ADD COLUMN master_id INTEGER REFERENCES estimate_master(id);
+       INSERT INTO estimate_master (estimate_no, date)
+           SELECT estimate_no, MIN(date) FROM estimates
+           WHERE estimate_no NOT IN (SELECT estimate_no FROM estimate_master WHERE estimate_no IS NOT NULL)
+           GROUP BY estimate_no;
+       CREATE INDEX IF NOT EXISTS idx_estimate_master_estimate_no ON estimate_master(estimate_no);
+       UPDATE estimates SET master_id =
+           (SELECT MIN(m.id) FROM estimate_master m WHERE m.estimate_no = estimates.estimate_no);
+       CREATE INDEX IF NOT EXISTS idx_estimates_master_id ON estimates(master_id);
+       DELETE FROM estimate_master
+           WHERE NOT EXISTS (SELECT 1 FROM estimates e WHERE e.master_id = estimate_master.id)
+             AND EXISTS (SELECT 1 FROM estimate_master d
+                         WHERE d.estimate_no = estimate_master.estimate_no AND d.id <> estimate_master.id);
+       UPDATE estimate_master SET
+           payment_mode = (SELECT e.payment_mode FROM estimates e WHERE e.master_id = estimate_master.id LIMIT 1),
+           status = CASE WHEN EXISTS (SELECT 1 FROM estimates e WHERE e.master_id = estimate_master.id)
+                          AND NOT EXISTS (SELECT 1 FROM estimates e
+                                          WHERE e.master_id = estimate_master.id AND e.status = 'Active')
+                         THEN 'Cancelled' ELSE 'Active' END,
+           subtotal = ROUND((SELECT TOTAL(e.total) FROM estimates e WHERE e.master_id = estimate_master.id), 2);
+       UPDATE estimate_master SET gst = ROUND(subtotal * {GST_RATE}, 2), total = ROUND(subtotal * (1 + {GST_RATE}), 2);
+       CREATE INDEX IF NOT EXISTS idx_estimate_master_status ON estimate_master(status);
+       CREATE INDEX IF NOT EXISTS idx_estimate_master_date ON estimate_master(date);""",
+    # 4: monthly and yearly rollups of active lines by mode and item, kept current
+    #    by triggers alongside daily_summary
+    """CREATE TABLE IF NOT EXISTS monthly_summary (
+           month TEXT NOT NULL,
+           payment_mode TEXT NOT NULL,
+           description TEXT NOT NULL,
+           lines INTEGER NOT NULL DEFAULT 0,
+           qty REAL NOT NULL DEFAULT 0,
+           total REAL NOT NULL DEFAULT 0,
+           PRIMARY KEY (month, payment_mode, description)
+       ) WITHOUT ROWID;
+       CREATE TABLE IF NOT EXISTS yearly_summary (
+           year TEXT NOT NULL,
+           payment_mode TEXT NOT NULL,
+           description TEXT NOT NULL,
+           lines INTEGER NOT NULL DEFAULT 0,
+           qty REAL NOT NULL DEFAULT 0,
+           total REAL NOT NULL DEFAULT 0,
+           PRIMARY KEY (year, payment_mode, description)
+       ) WITHOUT ROWID;
+       INSERT INTO monthly_summary (month, payment_mode, description, lines, qty, total)
+           SELECT substr(date, 1, 7), payment_mode, description, SUM(lines), TOTAL(qty), TOTAL(total)
+           FROM daily_summary
+           GROUP BY 1, 2, 3;
+       INSERT INTO yearly_summary (year, payment_mode, description, lines, qty, total)
+           SELECT substr(month, 1, 4), payment_mode, description, SUM(lines), TOTAL(qty), TOTAL(total)
+           FROM monthly_summary
+           GROUP BY 1, 2, 3;
+       CREATE TRIGGER IF NOT EXISTS trg_estimates_rollup_insert
+       AFTER INSERT ON estimates WHEN NEW.status='Active'
+       BEGIN
+           INSERT INTO monthly_summary (month, payment_mode, description, lines, qty, total)
+               VALUES (substr(COALESCE(NEW.date, ''), 1, 7), COALESCE(NEW.payment_mode, ''),
+                       COALESCE(NEW.description, ''), 1, COALESCE(NEW.qty, 0), COALESCE(NEW.total, 0))
+               ON CONFLICT (month, payment_mode, description) DO UPDATE SET
+                   lines = lines + 1, qty = qty + excluded.qty, total = total + excluded.total;
+           INSERT INTO yearly_summary (year, payment_mode, description, lines, qty, total)
+               VALUES (substr(COALESCE(NEW.date, ''), 1, 4), COALESCE(NEW.payment_mode, ''),
+                       COALESCE(NEW.description, ''), 1, COALESCE(NEW.qty, 0), COALESCE(NEW.total, 0))
+               ON CONFLICT (year, payment_mode, description) DO UPDATE SET
+                   lines = lines + 1, qty = qty + excluded.qty, total = total + excluded.total;
+       END;
+       CREATE TRIGGER IF NOT EXISTS trg_estimates_rollup_cancel
+       AFTER UPDATE OF status ON estimates WHEN OLD.status='Active' AND NEW.status='Cancelled'
+       BEGIN
+           UPDATE monthly_summary
+               SET lines = lines - 1, qty = qty - COALESCE(OLD.qty, 0), total = total - COALESCE(OLD.total, 0)
+               WHERE month=substr(COALESCE(OLD.date, ''), 1, 7) AND payment_mode=COALESCE(OLD.payment_mode, '')
+                 AND description=COALESCE(OLD.description, '');
+           DELETE FROM monthly_summary
+               WHERE month=substr(COALESCE(OLD.date, ''), 1, 7) AND payment_mode=COALESCE(OLD.payment_mode, '')
+                 AND description=COALESCE(OLD.description, '') AND lines <= 0;
+           UPDATE yearly_summary
+               SET lines = lines - 1, qty = qty - COALESCE(OLD.qty, 0), total = total - COALESCE(OLD.total, 0)
+               WHERE year=substr(COALESCE(OLD.date, ''), 1, 4) AND payment_mode=COALESCE(OLD.payment_mode, '')
+                 AND description=COALESCE(OLD.description, '');
+           DELETE FROM yearly_summary
+               WHERE year=substr(COALESCE(OLD.date, ''), 1, 4) AND payment_mode=COALESCE(OLD.payment_mode, '')
+                 AND description=COALESCE(OLD.description, '') AND lines <= 0;
+       END;""",
+    # 5: the item catalog (names, display names, rates, button order) and the
+    #    keyboard shortcuts, previously the items_config.json file
+    """CREATE TABLE IF NOT EXISTS items (
+           name TEXT PRIMARY KEY,
+           display_name TEXT NOT NULL,
+           rate REAL NOT NULL DEFAULT 0,
+           position INTEGER NOT NULL
+       );
+       CREATE INDEX IF NOT EXISTS idx_items_position ON items(position);
+       CREATE TABLE IF NOT EXISTS shortcuts (
+           shortcut TEXT PRIMARY KEY,
+           item TEXT NOT NULL REFERENCES items(name)
+       );
+       CREATE INDEX IF NOT EXISTS idx_shortcuts_item ON shortcuts(item);""",
+    # 6: per-prefix, per-year estimate number sequences, incremented inside the
+    #    save transaction and seeded from the numbers already issued
+    """CREATE TABLE IF NOT EXISTS estimate_sequence (
+           prefix TEXT NOT NULL,
+           year INTEGER NOT NULL,
+           last_seq INTEGER NOT NULL,
+           PRIMARY KEY (prefix, year)
+       ) WITHOUT ROWID;""" + SEQUENCE_SYNC_SQL,
+    # 7: the counter that saved each estimate, for per-terminal totals
+    """ALTER TABLE estimate_master ADD COLUMN terminal_id TEXT;
+       CREATE INDEX IF NOT EXISTS idx_estimate_master_date_terminal
+           ON estimate_master(date, terminal_id, status, subtotal);""",
+    # 8: how far each legacy database import has got (legacy_import.py)
+    """CREATE TABLE IF NOT EXISTS legacy_import_progress (
+           source TEXT PRIMARY KEY,
+           last_key INTEGER NOT NULL,
+           last_invoice_no TEXT NOT NULL,
+           invoices INTEGER NOT NULL DEFAULT 0,
+           lines INTEGER NOT NULL DEFAULT 0,
+           finished INTEGER NOT NULL DEFAULT 0
+       );""",
+]
+
+
+def period_range(period, today=None):
+    # Inclusive (from, to) ISO dates for one of REPORT_PERIODS. Current periods
+    # end today; "Last" periods are the full previous month or financial year.
+    today = today or datetime.date.today()
+    if period == "Today":
+        start, end = today, today
+    elif period == "This Week":
+        start, end = today - datetime.timedelta(days=today.weekday()), today
+    elif period == "This Month":
+        start, end = today.replace(day=1), today
+    elif period == "Last Month":
+        end = today.replace(day=1) - datetime.timedelta(days=1)
+        start = end.replace(day=1)
+    elif period in ("This Financial Year", "Last Financial Year"):
+        year = today.year if today.month >= FINANCIAL_YEAR_START_MONTH else today.year - 1
+        start = datetime.date(year, FINANCIAL_YEAR_START_MONTH, 1)
+        end = today
+        if period == "Last Financial Year":
+            end = start - datetime.timedelta(days=1)
+            start = start.replace(year=year - 1)
+    else:
+        raise ValueError(f"Unknown report period: {period}")
+    return start.isoformat(), end.isoformat()
+
+
+def period_heading(date_from, date_to):
+    return f"Date: {date_from}" if date_from == date_to else f"Period: {date_from} to {date_to}"
+
+
+def export_format(path):
+    # (format, gzip) implied by an export file name such as sales.csv or sales.jsonl.gz
+    name = path.lower()
+    compress = name.endswith(".gz")
+    if compress:
+        name = name[:-3]
+    return ("jsonl" if name.endswith((".jsonl", ".json")) else "csv"), compress
+
+
+class Estimate:
+    # An estimate being built; BillingEngine.commit_estimate numbers it and
+    # writes it to the database. The subtotal is kept as a
+    # running sum in paise, so totals stay exact and cost nothing per line.
+    def __init__(self, estimate_no=None, payment_mode="Cash"):
+        self.estimate_no = estimate_no
+        self.payment_mode = payment_mode
+        self.lines = []
+        self.subtotal_paise = 0
+
+    def add_line(self, desc, qty, rate):
+        line = {"desc": desc, "qty": qty, "rate": rate, "total": round(qty * rate, 2)}
+        self.lines.append(line)
+        self.subtotal_paise += round(line["total"] * 100)
+        return line
+
+    def remove_line(self, index):
+        line = self.lines.pop(index)
+        self.subtotal_paise -= round(line["total"] * 100)
+        return line
+
+    @property
+    def subtotal(self):
+        return self.subtotal_paise / 100
+
+    @property
+    def gst(self):
+        return round(self.subtotal * GST_RATE, 2)
+
+    @property
+    def total(self):
+        return round(self.subtotal * (1 + GST_RATE), 2)
+
+    def receipt_lines(self):
+        return [(line["desc"], line["qty"], line["rate"], line["total"]) for line in self.lines]
+
+
+class ReceiptRenderer:
+    # Builds the 42-column receipt text once per estimate and keeps it, along with
+    # the PDF the spooler renders from it, under a hash of the estimate number,
+    # date, payment mode and lines. Shared with the spooler thread, hence the lock.
+    def __init__(self, display_names, size=RECEIPT_CACHE_SIZE):
+        self.display_names = display_names
+        self.size = size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def render(self, estimate_no, date, lines, payment_mode):
+        lines = [(self.display_names.get(desc, desc)[:20], float(qty), float(rate), float(total or 0))
+                 for desc, qty, rate, total in lines]
+        key = hashlib.sha256(repr((estimate_no, date, payment_mode, lines)).encode()).hexdigest()
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry:
+                self.cache.move_to_end(key)
+                return key, entry["text"]
+
+        content = []
+        content.append("BBK Software Solutions")
+        content.append("-" * 42)
+        content.append(f"Estimate: {estimate_no:<20}")
+        content.append(f"Date: {date:<20}")
+        content.append("")
+        content.append(f"{'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}")
+        content.append("-" * 42)
+
+        total = 0.0
+        for name, qty, rate, total_line in lines:
+            content.append(f"{name:<20} {qty:>8.2f} {rate:>8.2f} {total_line:>8.2f}")
+            total += total_line
+
+        total_incl = round(total * (1 + GST_RATE), 2)
+        content.append("-" * 42)
+        content.append(f"{'Subtotal':<36} {total:>8.2f}")
+        content.append(f"{'GST (5%)':<36} {round(total * GST_RATE, 2):>8.2f}")
+        content.append(f"{'TOTAL':<36} {total_incl:>8.2f}")
+        content.append(f"{'Mode':<36} {payment_mode:>8}")
+        text_content = "\n".join(content)
+
+        with self.lock:
+            self.cache[key] = {"text": text_content, "pdf": None}
+            while len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+        return key, text_content
+
+    def get_pdf(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            return entry["pdf"] if entry else None
+
+    def store_pdf(self, key, pdf_data):
+        with self.lock:
+            if key in self.cache:
+                self.cache[key]["pdf"] = pdf_data
+
+
+class BillingEngine:
+    # Estimate numbering, persistence, cancellation and reports over the SQLite
+    # database, with no UI dependency. BillingApp is a view over one of these.
+    def __init__(self, db_file=DB_FILE, storage_profile=STORAGE_PROFILE, display_names=None,
+                 estimate_prefix=ESTIMATE_PREFIX, terminal_id=TERMINAL_ID, busy_timeout=BUSY_TIMEOUT_MS,
+                 read_only=False):
+        # read_only opens an existing database for reports and lookups only: no
+        # schema setup, and any write fails.
+        self.db_file = db_file
+        self.read_only = read_only
+        self.storage_profile = storage_profile
+        self.estimate_prefix = estimate_prefix
+        self.terminal_id = terminal_id
+        self.busy_timeout = busy_timeout
+        self.data_version = None
+        self.display_names = display_names if display_names is not None else {}
+        self.receipts = ReceiptRenderer(self.display_names)
+        self.today_total_date = None
+        self.today_total_base = 0.0
+        self.local_writes = 0
+        self.report_cache = OrderedDict()
+        self.open()
+
+    def open(self):
+        if self.read_only:
+            self.conn = sqlite3.connect(f"file:{os.path.abspath(self.db_file)}?mode=ro", uri=True,
+                                        timeout=self.busy_timeout / 1000)
+        else:
+            self.conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout / 1000)
+        self.c = self.conn.cursor()
+        self.c.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        if not self.read_only:
+            profile = STORAGE_PROFILES[self.storage_profile]
+            self.c.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+            self.c.execute(f"PRAGMA synchronous={profile['synchronous']}")
+            self.setup_database()
+        self.today_total_date = None
+        self.report_cache.clear()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def setup_database(self):
+        self.c.execute("""CREATE TABLE IF NOT EXISTS estimates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            estimate_no TEXT,
+            date TEXT,
+            description TEXT,
+            qty REAL,
+            unit_price REAL,
+            total REAL,
+            payment_mode TEXT,
+            status TEXT DEFAULT 'Active'
+        )""")
+        self.c.execute("""CREATE TABLE IF NOT EXISTS estimate_master (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            estimate_no TEXT,
+            date TEXT
+        )""")
+        self.conn.commit()
+        self.migrate_database()
+
+    def migrate_database(self):
+        # user_version is read again under the write lock, so terminals starting
+        # together on an old file apply each migration once and never move the
+        # version back.
+        version = self.c.execute("PRAGMA user_version").fetchone()[0]
+        for number in range(version + 1, len(SCHEMA_MIGRATIONS) + 1):
+            self.run_write(lambda: self.apply_migration(number))
+
+    def apply_migration(self, number):
+        with self.write_transaction():
+            if self.c.execute("PRAGMA user_version").fetchone()[0] >= number:
+                return
+            # Statement by statement: executescript would commit the open transaction
+            statement = ""
+            for line in SCHEMA_MIGRATIONS[number - 1].splitlines(keepends=True):
+                statement += line
+                if sqlite3.complete_statement(statement):
+                    self.c.execute(statement)
+                    statement = ""
+            self.c.execute(f"PRAGMA user_version = {number}")
+
+    def display_name(self, desc):
+        return self.display_names.get(desc, desc)
+
+    def today_str(self):
+        return datetime.datetime.now().strftime("%Y-%m-%d")
+
+    @contextmanager
+    def write_transaction(self):
+        # BEGIN IMMEDIATE ... COMMIT around the block; rolled back if it raises.
+        self.c.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.c
+            self.conn.commit()
+        except BaseException:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            raise
+
+    def run_write(self, write):
+        # Runs a write transaction, retrying with backoff while another connection
+        # holds the lock beyond busy_timeout. write() must roll back on error, e.g.
+        # by using write_transaction().
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                return write()
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == WRITE_RETRIES or ("locked" not in message and "busy" not in message):
+                    raise
+                time.sleep(WRITE_RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def data_changed(self):
+        # True when another connection has committed since the last call.
+        version = self.c.execute("PRAGMA data_version").fetchone()[0]
+        changed = self.data_version is not None and version != self.data_version
+        self.data_version = version
+        return changed
+
+    # Report cache. Entries carry the report_stamp() taken when the report was
+    # started. PRAGMA data_version moves when another connection commits, but not
+    # for writes on this one, so those are counted by note_write().
+
+    def note_write(self):
+        self.local_writes += 1
+
+    def report_stamp(self):
+        return self.local_writes, self.c.execute("PRAGMA data_version").fetchone()[0]
+
+    def cached_report(self, key, stamp):
+        entry = self.report_cache.get(key)
+        if entry is None or entry[0] != stamp:
+            return None
+        self.report_cache.move_to_end(key)
+        return entry[1]
+
+    def store_report(self, key, stamp, text):
+        self.report_cache[key] = (stamp, text)
+        self.report_cache.move_to_end(key)
+        while len(self.report_cache) > REPORT_CACHE_SIZE:
+            self.report_cache.popitem(last=False)
+
+    # Estimates
+
+    def format_estimate_no(self, year, seq):
+        return f"{self.estimate_prefix}/{year}/{seq:0{ESTIMATE_SEQ_DIGITS}d}"
+
+    def next_estimate_no(self, date_str=None):
+        # Provisional number for a draft: what the next save would get if no other
+        # terminal saves first. The real number is allocated by commit_estimate.
+        year = int((date_str or self.today_str())[:4])
+        self.c.execute("SELECT last_seq FROM estimate_sequence WHERE prefix=? AND year=?",
+                       (self.estimate_prefix, year))
+        row = self.c.fetchone()
+        return self.format_estimate_no(year, (row[0] if row else 0) + 1)
+
+    def allocate_estimate_no(self, date_str):
+        # Must run inside the save's write transaction, which serialises allocation
+        # across connections and rolls the increment back if the save fails.
+        year = int(date_str[:4])
+        self.c.execute("""INSERT INTO estimate_sequence (prefix, year, last_seq) VALUES (?, ?, 1)
+                          ON CONFLICT (prefix, year) DO UPDATE SET last_seq = last_seq + 1""",
+                       (self.estimate_prefix, year))
+        self.c.execute("SELECT last_seq FROM estimate_sequence WHERE prefix=? AND year=?",
+                       (self.estimate_prefix, year))
+        return self.format_estimate_no(year, self.c.fetchone()[0])
+
+    def sync_estimate_sequence(self):
+        with self.write_transaction():
+            self.c.execute(SEQUENCE_SYNC_SQL)
+
+    def new_estimate(self, payment_mode="Cash"):
+        return Estimate(payment_mode=payment_mode)
+
+    def commit_estimate(self, estimate, date_str=None):
+        # Numbers the estimate and writes the header and all lines in one
+        # transaction; returns the header id. sqlite3.Error propagates after the
+        # transaction is rolled back (and any lock retries are spent), leaving the
+        # estimate unnumbered.
+        if not estimate.lines:
+            raise ValueError("No items in estimate")
+        date_str = date_str or self.today_str()
+        subtotal = estimate.subtotal
+
+        def write():
+            try:
+                with self.write_transaction():
+                    estimate.estimate_no = self.allocate_estimate_no(date_str)
+                    self.c.execute("""INSERT INTO estimate_master
+                                      (estimate_no,date,payment_mode,status,subtotal,gst,total,terminal_id)
+                                      VALUES (?,?,?, 'Active',?,?,?,?)""",
+                                   (estimate.estimate_no, date_str, estimate.payment_mode, subtotal,
+                                    estimate.gst, estimate.total, self.terminal_id))
+                    master_id = self.c.lastrowid
+                    self.c.executemany("""INSERT INTO estimates
+                                          (master_id,estimate_no,date,description,qty,unit_price,total,payment_mode,status)
+                                          VALUES (?,?,?,?,?,?,?,?, 'Active')""",
+                                       [(master_id, estimate.estimate_no, date_str, line["desc"], line["qty"],
+                                         line["rate"], line["total"], estimate.payment_mode)
+                                        for line in estimate.lines])
+                return master_id
+            except sqlite3.Error:
+                estimate.estimate_no = None
+                raise
+
+        master_id = self.run_write(write)
+        self.adjust_today_total(date_str, subtotal)
+        return master_id
+
+    def cancel_estimate(self, master_id):
+        # Cancels the header and its lines; returns False if it was not active.
+        self.c.execute("SELECT date, subtotal, status FROM estimate_master WHERE id=?", (master_id,))
+        row = self.c.fetchone()
+        if not row or row[2] != 'Active':
+            return False
+        est_date, subtotal, _ = row
+
+        def write():
+            with self.write_transaction():
+                self.c.execute("UPDATE estimate_master SET status='Cancelled' WHERE id=? AND status='Active'",
+                               (master_id,))
+                cancelled = self.c.rowcount
+                self.c.execute("UPDATE estimates SET status='Cancelled' WHERE master_id=? AND status='Active'",
+                               (master_id,))
+            return cancelled
+
+        cancelled = self.run_write(write)
+        if cancelled:
+            self.adjust_today_total(est_date, -float(subtotal or 0))
+        return bool(cancelled)
+
+    def find_estimate_id(self, estimate_no, active_only=False):
+        self.c.execute(f"""SELECT id FROM estimate_master
+                           WHERE estimate_no=? {"AND status='Active'" if active_only else ""}
+                           ORDER BY id DESC LIMIT 1""", (estimate_no,))
+        row = self.c.fetchone()
+        return row[0] if row else None
+
+    def estimate_page(self, active_only=False, date=None, before_id=None, limit=ESTIMATE_PAGE_SIZE):
+        # One page of estimate headers, newest first, keyed on id < before_id.
+        conditions, params = [], []
+        if active_only:
+            conditions.append("status='Active'")
+        if date:
+            conditions.append("date=?")
+            params.append(date)
+        if before_id is not None:
+            conditions.append("id<?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.c.execute(f"""SELECT id, estimate_no, date, subtotal
+                           FROM estimate_master {where}
+                           ORDER BY id DESC LIMIT ?""", (*params, limit))
+        return self.c.fetchall()
+
+    def estimate_details(self, master_id):
+        # (header, lines) for an estimate, header being
+        # (estimate_no, date, payment_mode, status); None if it does not exist.
+        self.c.execute("""SELECT estimate_no, date, payment_mode, status
+                          FROM estimate_master WHERE id=?""", (master_id,))
+        header = self.c.fetchone()
+        if not header:
+            return None
+        self.c.execute("""SELECT description, qty, unit_price, total
+                          FROM estimates
+                          WHERE master_id=? ORDER BY id""", (master_id,))
+        return header, self.c.fetchall()
+
+    def render_receipt(self, estimate_no, date, lines, payment_mode):
+        # date is the stored YYYY-MM-DD date; receipts print it as DD-MM-YYYY.
+        display_date = datetime.datetime.strptime(date, "%Y-%m-%d").strftime("%d-%m-%Y")
+        return self.receipts.render(estimate_no, display_date, lines, payment_mode)
+
+    # Today's total
+
+    def adjust_today_total(self, date_str, delta):
+        if date_str == self.today_total_date:
+            self.today_total_base += delta
+
+    def today_total(self, recompute=False):
+        # Today's active sales including GST. The running figure is adjusted by
+        # this engine's commits and cancellations and recomputed on request, on day
+        # rollover, or when another terminal has written to the database.
+        t = self.today_str()
+        if self.data_changed() or recompute or t != self.today_total_date:
+            self.c.execute("SELECT SUM(total) FROM daily_summary WHERE date=?", (t,))
+            self.today_total_base = float(self.c.fetchone()[0] or 0.0)
+            self.today_total_date = t
+        return round(self.today_total_base * (1 + GST_RATE), 2)
+
+    # Reports. Each report takes a date or an inclusive from/to range and streams
+    # its rows from a cursor in REPORT_FETCH_SIZE batches into a line generator;
+    # the *_report methods join those lines into the final text.
+
+    def iter_rows(self, sql, params):
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(REPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cur.close()
+
+    def report_range(self, date_from=None, date_to=None):
+        date_from = date_from or self.today_str()
+        return date_from, date_to or date_from
+
+    def daily_sales_rows(self, date_from, date_to, mode):
+        return self.iter_rows("""SELECT description, SUM(qty) AS q, SUM(total) AS s
+                                 FROM daily_summary
+                                 WHERE date BETWEEN ? AND ? AND payment_mode=?
+                                 GROUP BY description
+                                 ORDER BY description""", (date_from, date_to, mode))
+
+    def detailed_sales_rows(self, date_from, date_to, mode):
+        return self.iter_rows("""SELECT estimate_no, description, qty, unit_price, total
+                                 FROM estimates
+                                 WHERE date BETWEEN ? AND ? AND payment_mode=? AND status='Active'
+                                 ORDER BY date, master_id, id""", (date_from, date_to, mode))
+
+    def cancelled_estimate_rows(self, date_from, date_to):
+        return self.iter_rows("""SELECT estimate_no, subtotal
+                                 FROM estimate_master
+                                 WHERE date BETWEEN ? AND ? AND status='Cancelled'
+                                 ORDER BY date, id""", (date_from, date_to))
+
+    def daily_sales_report_lines(self, date_from=None, date_to=None):
+        date_from, date_to = self.report_range(date_from, date_to)
+        yield "Daily Sales Report" if date_from == date_to else "Sales Summary Report"
+        yield period_heading(date_from, date_to)
+        yield "-" * 42
+        grand_total = 0.0
+        for mode in PAYMENT_MODES:
+            yield f"{mode} Sales:"
+            yield f"{'Item':<20} {'Qty':>8} {'Amount':>8}"
+            yield "-" * 42
+            mode_base = 0.0
+            for desc, q, s in self.daily_sales_rows(date_from, date_to, mode):
+                name = self.display_name(desc)[:20]
+                yield f"{name:<20} {q:>8.2f} {s:>8.2f}"
+                mode_base += float(s or 0)
+            mode_incl = round(mode_base * (1 + GST_RATE), 2)
+            grand_total += mode_incl
+            yield "-" * 42
+            yield f"{'Subtotal':<36} {mode_base:>8.2f}"
+            yield f"{'GST (5%)':<36} {round(mode_base * GST_RATE, 2):>8.2f}"
+            yield f"{'Total':<36} {mode_incl:>8.2f}"
+            yield ""
+
+        yield "-" * 42
+        yield f"{'Grand Total':<36} {grand_total:>8.2f}"
+
+    def detailed_sales_report_lines(self, date_from=None, date_to=None):
+        date_from, date_to = self.report_range(date_from, date_to)
+        yield "Detailed Sales Report"
+        yield period_heading(date_from, date_to)
+        yield ""
+        yield f"{'Estimate No':<20} {'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}"
+        yield "-" * 67
+
+        grand_total = 0.0
+        for mode in PAYMENT_MODES:
+            yield f"{mode} Estimates"
+            yield f"{'Estimate No':<20} {'Item':<20} {'Qty':>8} {'Rate':>8} {'Total':>8}"
+            yield "-" * 67
+
+            mode_base = 0.0
+            for est, desc, qty, rate, total in self.detailed_sales_rows(date_from, date_to, mode):
+                name = self.display_name(desc)[:20]
+                yield f"{est or '':<20} {name:<20} {qty:>8.2f} {rate:>8.2f} {total:>8.2f}"
+                mode_base += float(total or 0)
+            mode_incl = round(mode_base * (1 + GST_RATE), 2)
+            grand_total += mode_incl
+            yield ""
+            yield f"{'Subtotal':<56} {mode_base:>8.2f}"
+            yield f"{'GST (5%)':<56} {round(mode_base * GST_RATE, 2):>8.2f}"
+            yield f"{'Total (incl GST)':<56} {mode_incl:>8.2f}"
+            yield ""
+
+        yield "-" * 67
+        yield f"{'Grand Total (incl GST)':<56} {grand_total:>8.2f}"
+
+    def cancelled_estimates_report_lines(self, date_from=None, date_to=None):
+        date_from, date_to = self.report_range(date_from, date_to)
+        yield "Cancelled Estimates Report"
+        yield period_heading(date_from, date_to)
+        yield "-" * 42
+        yield f"{'Estimate No':<20} {'Amount':>8}"
+        yield "-" * 42
+
+        tot = 0.0
+        for est, s in self.cancelled_estimate_rows(date_from, date_to):
+            yield f"{est or '':<20} {(s or 0):>8.2f}"
+            tot += float(s or 0)
+        yield "-" * 42
+        yield f"{'Total Cancelled':<20} {tot:>8.2f}"
+
+    def daily_sales_report(self, date_from=None, date_to=None):
+        return "\n".join(self.daily_sales_report_lines(date_from, date_to))
+
+    def detailed_sales_report(self, date_from=None, date_to=None):
+        return "\n".join(self.detailed_sales_report_lines(date_from, date_to))
+
+    def cancelled_estimates_report(self, date_from=None, date_to=None):
+        return "\n".join(self.cancelled_estimates_report_lines(date_from, date_to))
+
+    # Long-horizon reports, read from the monthly and yearly rollups
+
+    def monthly_sales_rows(self, month_from, month_to):
+        return self.iter_rows("""SELECT month, payment_mode, SUM(total)
+                                 FROM monthly_summary
+                                 WHERE month BETWEEN ? AND ?
+                                 GROUP BY month, payment_mode
+                                 ORDER BY month""", (month_from, month_to))
+
+    def yearly_sales_rows(self):
+        return self.iter_rows("""SELECT year, payment_mode, SUM(total)
+                                 FROM yearly_summary
+                                 GROUP BY year, payment_mode
+                                 ORDER BY year""", ())
+
+    def period_mode_totals(self, rows):
+        # Folds (period, mode, total) rows ordered by period into one
+        # (period, {mode: total}) pair per period.
+        current, totals = None, {}
+        for period, mode, total in rows:
+            if period != current and current is not None:
+                yield current, totals
+                totals = {}
+            current = period
+            totals[mode] = totals.get(mode, 0.0) + float(total or 0)
+        if current is not None:
+            yield current, totals
+
+    def mode_totals_header(self, label):
+        return f"{label:<10} " + " ".join(f"{mode:>12}" for mode in PAYMENT_MODES) + f" {'Total':>12}"
+
+    def mode_totals_line(self, period, totals):
+        return (f"{period:<10} " + " ".join(f"{totals.get(mode, 0.0):>12.2f}" for mode in PAYMENT_MODES)
+                + f" {sum(totals.values()):>12.2f}")
+
+    def monthly_sales_report_lines(self, date_from=None, date_to=None):
+        if date_from is None:
+            date_from, date_to = period_range("This Financial Year")
+        date_from, date_to = self.report_range(date_from, date_to)
+        yield "Month-by-Month Sales Report"
+        yield f"Period: {date_from[:7]} to {date_to[:7]}"
+        yield "-" * 54
+        yield self.mode_totals_header("Month")
+        yield "-" * 54
+        grand_base = 0.0
+        for month, totals in self.period_mode_totals(self.monthly_sales_rows(date_from[:7], date_to[:7])):
+            grand_base += sum(totals.values())
+            yield self.mode_totals_line(month, totals)
+        yield "-" * 54
+        yield f"{'Subtotal':<41} {grand_base:>12.2f}"
+        yield f"{'GST (5%)':<41} {round(grand_base * GST_RATE, 2):>12.2f}"
+        yield f"{'Total (incl GST)':<41} {round(grand_base * (1 + GST_RATE), 2):>12.2f}"
+
+    def yearly_sales_report_lines(self):
+        yield "Year-over-Year Sales Report"
+        yield "-" * 63
+        yield self.mode_totals_header("Year") + f" {'Change':>8}"
+        yield "-" * 63
+        previous = None
+        for year, totals in self.period_mode_totals(self.yearly_sales_rows()):
+            total = sum(totals.values())
+            change = f"{(total - previous) / previous * 100:+.1f}%" if previous else ""
+            yield self.mode_totals_line(year, totals) + f" {change:>8}"
+            previous = total
+        yield "-" * 63
+        yield "Amounts exclude GST; change is against the previous year."
+
+    def monthly_sales_report(self, date_from=None, date_to=None):
+        return "\n".join(self.monthly_sales_report_lines(date_from, date_to))
+
+    def yearly_sales_report(self):
+        return "\n".join(self.yearly_sales_report_lines())
+
+    # Export
+
+    def export_rows(self, date_from, date_to):
+        return self.iter_rows("""SELECT e.date, e.estimate_no, m.payment_mode, m.status, e.status, e.description,
+                                        e.qty, e.unit_price, e.total, m.subtotal, m.gst, m.total
+                                 FROM estimates e LEFT JOIN estimate_master m ON m.id = e.master_id
+                                 WHERE e.date BETWEEN ? AND ?
+                                 ORDER BY e.date, e.master_id, e.id""", (date_from, date_to))
+
+    def export_estimates(self, path, date_from=None, date_to=None, fmt=None, compress=None):
+        # Streams every line in the range, active and cancelled, to CSV or JSON Lines,
+        # optionally gzipped. Written to a temporary file and renamed into place so
+        # an interrupted export never leaves a partial file behind. Returns the row count.
+        date_from, date_to = self.report_range(date_from, date_to)
+        implied_fmt, implied_compress = export_format(path)
+        fmt = fmt or implied_fmt
+        compress = implied_compress if compress is None else compress
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        tmp_path = path + ".part"
+        opener = gzip.open if compress else open
+        count = 0
+        try:
+            with opener(tmp_path, "wt", encoding="utf-8", newline="") as f:
+                if fmt == "csv":
+                    writer = csv.writer(f)
+                    writer.writerow(EXPORT_COLUMNS)
+                    for row in self.export_rows(date_from, date_to):
+                        writer.writerow(row)
+                        count += 1
+                else:
+                    for row in self.export_rows(date_from, date_to):
+                        f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n")
+                        count += 1
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return count
+
+    # Item catalog. Held in the items and shortcuts tables and changed a row at a
+    # time; the JSON config layout ({"items", "display_names", "rates", "shortcuts"})
+    # is kept as the import/export format.
+
+    def catalog_is_empty(self):
+        self.c.execute("SELECT 1 FROM items LIMIT 1")
+        return self.c.fetchone() is None
+
+    def export_catalog(self):
+        self.c.execute("SELECT name, display_name, rate FROM items ORDER BY position")
+        rows = self.c.fetchall()
+        self.c.execute("SELECT shortcut, item FROM shortcuts ORDER BY shortcut")
+        return {
+            "items": [name for name, _, _ in rows],
+            "display_names": {name: display for name, display, _ in rows},
+            "rates": {name: rate for name, _, rate in rows},
+            "shortcuts": dict(self.c.fetchall()),
+        }
+
+    def import_catalog(self, config):
+        # Replaces the whole catalog in one transaction.
+        items = list(config.get("items", []))
+        display_names = config.get("display_names", {})
+        rates = config.get("rates", {})
+        shortcuts = {k: v for k, v in config.get("shortcuts", {}).items() if v in items}
+        with self.write_transaction():
+            self.c.execute("DELETE FROM shortcuts")
+            self.c.execute("DELETE FROM items")
+            self.c.executemany("INSERT INTO items (name, display_name, rate, position) VALUES (?,?,?,?)",
+                               [(name, display_names.get(name, name), float(rates.get(name, 0.0)), position)
+                                for position, name in enumerate(dict.fromkeys(items))])
+            self.c.executemany("INSERT INTO shortcuts (shortcut, item) VALUES (?,?)", shortcuts.items())
+
+    def load_catalog_file(self, path):
+        with open(path, "r") as f:
+            self.import_catalog(json.load(f))
+
+    def save_catalog_file(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.export_catalog(), f, indent=4)
+        os.replace(tmp_path, path)
+
+    def add_item(self, name, shortcut=None, rate=0.0, display_name=None):
+        with self.write_transaction():
+            self.c.execute("""INSERT INTO items (name, display_name, rate, position)
+                              VALUES (?, ?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM items))""",
+                           (name, display_name or name, float(rate)))
+            if shortcut is not None:
+                self.c.execute("INSERT INTO shortcuts (shortcut, item) VALUES (?,?)", (shortcut, name))
+
+    def remove_item(self, name):
+        with self.write_transaction():
+            self.c.execute("DELETE FROM shortcuts WHERE item=?", (name,))
+            self.c.execute("DELETE FROM items WHERE name=?", (name,))
+
+    def set_item_rates(self, rates):
+        # rates: {name: rate}; only the given items are touched.
+        with self.write_transaction():
+            self.c.executemany("UPDATE items SET rate=? WHERE name=?",
+                               [(float(rate), name) for name, rate in rates.items()])
+
+    # Per-terminal totals
+
+    def terminal_totals(self, date_from=None, date_to=None):
+        # [(terminal_id, estimates, subtotal)] of active estimates in the range
+        date_from, date_to = self.report_range(date_from, date_to)
+        self.c.execute("""SELECT COALESCE(terminal_id, ''), COUNT(*), TOTAL(subtotal)
+                          FROM estimate_master
+                          WHERE date BETWEEN ? AND ? AND status='Active'
+                          GROUP BY 1 ORDER BY 1""", (date_from, date_to))
+        return self.c.fetchall()
+
+    def terminal_today_total(self):
+        # This terminal's active sales today, including GST
+        t = self.today_str()
+        self.c.execute("""SELECT TOTAL(subtotal) FROM estimate_master
+                          WHERE date=? AND terminal_id=? AND status='Active'""", (t, self.terminal_id))
+        return round(self.c.fetchone()[0] * (1 + GST_RATE), 2)
+
+    def terminal_totals_report_lines(self, date_from=None, date_to=None):
+        date_from, date_to = self.report_range(date_from, date_to)
+        yield "Terminal Totals Report"
+        yield period_heading(date_from, date_to)
+        yield "-" * 42
+        yield f"{'Terminal':<16} {'Estimates':>9} {'Amount':>15}"
+        yield "-" * 42
+        grand_base = 0.0
+        for terminal, count, subtotal in self.terminal_totals(date_from, date_to):
+            yield f"{(terminal or '-')[:16]:<16} {count:>9} {subtotal:>15.2f}"
+            grand_base += subtotal
+        yield "-" * 42
+        yield f"{'Subtotal':<26} {grand_base:>15.2f}"
+        yield f"{'GST (5%)':<26} {round(grand_base * GST_RATE, 2):>15.2f}"
+        yield f"{'Total (incl GST)':<26} {round(grand_base * (1 + GST_RATE), 2):>15.2f}"
+
+    def terminal_totals_report(self, date_from=None, date_to=None):
+        return "\n".join(self.terminal_totals_report_lines(date_from, date_to))
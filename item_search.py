@@ -0,0 +1,96 @@
+# In-memory item search for the billing screen. A prefix trie over the words of
+# each item's name and display name answers type-ahead queries; when that finds
+# fewer than the requested number of matches, a trigram index adds close
+# misspellings ranked by trigram overlap.
+import heapq
+
+SEARCH_LIMIT = 10  # Matches returned per query
+FUZZY_MIN_SCORE = 0.35  # Trigram overlap (Dice coefficient) a fuzzy match must reach
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ItemIndex:
+    def __init__(self, items=(), display_names=None):
+        display_names = display_names or {}
+        self.texts = {}  # item -> lowercased "name display name"
+        self.grams = {}  # item -> its trigrams
+        self.trie = ({}, set())  # node: (children by character, items with a word through it)
+        self.postings = {}  # trigram -> items containing it
+        for item in items:
+            self.add(item, display_names.get(item, item))
+
+    def words(self, item):
+        return set(self.texts[item].split())
+
+    def add(self, item, display_name=None):
+        if item in self.texts:
+            self.remove(item)
+        text = item.lower() if not display_name or display_name == item else f"{item} {display_name}".lower()
+        self.texts[item] = text
+        for word in self.words(item):
+            node = self.trie
+            for ch in word:
+                node = node[0].setdefault(ch, ({}, set()))
+                node[1].add(item)
+        self.grams[item] = trigrams(text)
+        for gram in self.grams[item]:
+            self.postings.setdefault(gram, set()).add(item)
+
+    def remove(self, item):
+        if item not in self.texts:
+            return
+        for word in self.words(item):
+            node = self.trie
+            for ch in word:
+                node = node[0].get(ch)
+                if node is None:
+                    break
+                node[1].discard(item)
+        for gram in self.grams.pop(item):
+            self.postings[gram].discard(item)
+        del self.texts[item]
+
+    def prefix_matches(self, word):
+        node = self.trie
+        for ch in word:
+            node = node[0].get(ch)
+            if node is None:
+                return set()
+        return node[1]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+        # Every query word must start a word of the item; whole-text prefixes rank first
+        matches = None
+        for word in sorted(set(query.split()), key=len, reverse=True):
+            found = self.prefix_matches(word)
+            matches = set(found) if matches is None else matches & found
+            if not matches:
+                break
+        results = heapq.nsmallest(limit, matches or (),
+                                  key=lambda item: (not self.texts[item].startswith(query), len(item), item.lower()))
+        if len(results) >= limit:
+            return results
+
+        # Too few prefix matches: add items sharing enough trigrams with the query
+        query_grams = trigrams(query)
+        shared = {}
+        for gram in query_grams:
+            for item in self.postings.get(gram, ()):
+                shared[item] = shared.get(item, 0) + 1
+        found = set(results)
+        scored = []
+        for item, count in shared.items():
+            if item in found:
+                continue
+            score = 2 * count / (len(query_grams) + len(self.grams[item]))
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((-score, len(item), item.lower(), item))
+        results.extend(entry[-1] for entry in heapq.nsmallest(limit - len(results), scored))
+        return results
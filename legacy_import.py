@@ -0,0 +1,136 @@
+# Imports a database written by billing_app.py (invoices/invoice_master) into the
+# current estimates schema. Invoice numbers, dates, modes and cancelled status are
+# kept. Lines are read from the legacy file in one ordered pass and written in
+# batched transactions, each of which also records how far the import has got, so
+# an interrupted import resumes after the last committed batch.
+import os
+import sqlite3
+
+from billing_engine import GST_RATE
+
+LEGACY_DB_FILE = "../billing_data.db"
+LEGACY_BATCH_SIZE = 5000  # Lines per import transaction; whole invoices only
+
+
+class LegacyImportError(Exception):
+    pass
+
+
+# Invoice lines grouped by invoice, invoices in legacy header order. Lines whose
+# invoice has no header sort first under key 0. The (key, invoice_no) pair is the
+# resume position.
+LEGACY_LINES_SQL = """
+    WITH h AS (SELECT COALESCE(invoice_no, '') AS invoice_no, MIN(id) AS first_id, MIN(date) AS date
+               FROM invoice_master GROUP BY 1)
+    SELECT COALESCE(h.first_id, 0), COALESCE(i.invoice_no, ''), COALESCE(h.date, i.date),
+           i.date, i.description, i.qty, i.unit_price, i.total, i.payment_mode, COALESCE(i.status, 'Active')
+    FROM invoices i LEFT JOIN h ON h.invoice_no = COALESCE(i.invoice_no, '')
+    WHERE (COALESCE(h.first_id, 0), COALESCE(i.invoice_no, '')) > (?, ?)
+    ORDER BY 1, 2, i.id"""
+
+
+def open_legacy(legacy_file):
+    if not os.path.exists(legacy_file):
+        raise LegacyImportError(f"Legacy database not found: {legacy_file}")
+    conn = sqlite3.connect(f"file:{os.path.abspath(legacy_file)}?mode=ro", uri=True)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if not {"invoices", "invoice_master"} <= tables:
+        conn.close()
+        raise LegacyImportError(f"{legacy_file} has no invoices/invoice_master tables")
+    return conn
+
+
+def load_progress(engine, source):
+    engine.c.execute("""SELECT last_key, last_invoice_no, invoices, lines, finished
+                        FROM legacy_import_progress WHERE source=?""", (source,))
+    return engine.c.fetchone()
+
+
+def check_conflicts(engine, legacy):
+    # A fresh import must not reuse numbers the current database already has.
+    conflicts = 0
+    cur = legacy.execute("SELECT DISTINCT invoice_no FROM invoices WHERE invoice_no IS NOT NULL")
+    while True:
+        numbers = [r[0] for r in cur.fetchmany(500)]
+        if not numbers:
+            break
+        engine.c.execute(f"SELECT COUNT(*) FROM estimate_master WHERE estimate_no IN ({','.join('?' * len(numbers))})",
+                         numbers)
+        conflicts += engine.c.fetchone()[0]
+    if conflicts:
+        raise LegacyImportError(f"{conflicts} legacy invoice numbers already exist in the current database")
+
+
+def write_batch(engine, source, invoices, position, counts):
+    with engine.write_transaction() as c:
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM estimate_master")
+        next_id = c.fetchone()[0] + 1
+        headers, lines = [], []
+        for master_id, (invoice_no, date, invoice_lines) in enumerate(invoices, next_id):
+            subtotal = round(sum(float(line[4] or 0) for line in invoice_lines), 2)
+            status = "Active" if any(line[-1] == "Active" for line in invoice_lines) else "Cancelled"
+            headers.append((master_id, invoice_no, date, invoice_lines[0][5], status, subtotal,
+                            round(subtotal * GST_RATE, 2), round(subtotal * (1 + GST_RATE), 2)))
+            for line_date, desc, qty, rate, total, mode, line_status in invoice_lines:
+                lines.append((master_id, invoice_no, line_date, desc, qty, rate, total, mode, line_status))
+        c.executemany("""INSERT INTO estimate_master
+                         (id,estimate_no,date,payment_mode,status,subtotal,gst,total)
+                         VALUES (?,?,?,?,?,?,?,?)""", headers)
+        c.executemany("""INSERT INTO estimates
+                         (master_id,estimate_no,date,description,qty,unit_price,total,payment_mode,status)
+                         VALUES (?,?,?,?,?,?,?,?,?)""", lines)
+        c.execute("""INSERT INTO legacy_import_progress (source, last_key, last_invoice_no, invoices, lines)
+                     VALUES (?,?,?,?,?)
+                     ON CONFLICT (source) DO UPDATE SET
+                         last_key=excluded.last_key, last_invoice_no=excluded.last_invoice_no,
+                         invoices=excluded.invoices, lines=excluded.lines""",
+                  (source, position[0], position[1], counts[0] + len(headers), counts[1] + len(lines)))
+    counts[0] += len(headers)
+    counts[1] += len(lines)
+
+
+def import_legacy(engine, legacy_file=LEGACY_DB_FILE, batch_size=LEGACY_BATCH_SIZE, progress=None):
+    # Returns (invoices, lines) imported from this source in total, including any
+    # earlier interrupted runs. progress(lines_done, lines_total) is called after
+    # every committed batch.
+    source = os.path.abspath(legacy_file)
+    legacy = open_legacy(legacy_file)
+    try:
+        saved = load_progress(engine, source)
+        if saved and saved[4]:
+            return saved[2], saved[3]
+        if saved:
+            position, counts = (saved[0], saved[1]), [saved[2], saved[3]]
+        else:
+            check_conflicts(engine, legacy)
+            position, counts = (-1, ""), [0, 0]
+        lines_total = legacy.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+        cur = legacy.execute(LEGACY_LINES_SQL, position)
+        batch, batch_lines, current = [], 0, None
+        while True:
+            rows = cur.fetchmany(1000)
+            for key, invoice_no, header_date, *line in rows:
+                if current is None or (key, invoice_no) != current:
+                    if batch_lines >= batch_size:
+                        write_batch(engine, source, batch, current, counts)
+                        batch, batch_lines = [], 0
+                        if progress:
+                            progress(counts[1], lines_total)
+                    current = (key, invoice_no)
+                    batch.append((invoice_no, header_date or line[0], []))
+                batch[-1][2].append(line)
+                batch_lines += 1
+            if not rows:
+                break
+        if batch:
+            write_batch(engine, source, batch, current, counts)
+        engine.c.execute("UPDATE legacy_import_progress SET finished=1 WHERE source=?", (source,))
+        engine.conn.commit()
+        engine.sync_estimate_sequence()
+        engine.today_total(recompute=True)
+        if progress:
+            progress(counts[1], lines_total)
+        return counts[0], counts[1]
+    finally:
+        legacy.close()
@@ -0,0 +1,199 @@
+# Multi-terminal stress test: several processes save and cancel estimates against
+# one database file at the same time, then the result is checked for lost or
+# duplicated estimates, duplicate numbers, and summaries or per-terminal totals
+# that disagree with the raw lines. With --upgrade-lines the terminals all start
+# together on an un-migrated file in the original app's layout, as counters do
+# after an upgrade, so they also race to run the schema migrations.
+#
+#   python stress_test.py --terminals 4 --estimates 250 --busy-timeout 100
+#   python stress_test.py --upgrade-lines 100000
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from billing_engine import SCHEMA_MIGRATIONS, BillingEngine
+
+ITEMS = [("Soya Oil", 135.0), ("Palm Oil", 110.0), ("Sunflower Oil", 160.0), ("Mustard Oil", 170.0)]
+CANCEL_EVERY = 7  # Each terminal cancels every CANCEL_EVERY-th estimate it saved
+UPGRADE_LINES_PER_ESTIMATE = 4
+
+# The tables as the original billing app created them, before any migration
+BASELINE_SCHEMA = """
+    CREATE TABLE estimates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        estimate_no TEXT,
+        date TEXT,
+        description TEXT,
+        qty REAL,
+        unit_price REAL,
+        total REAL,
+        payment_mode TEXT,
+        status TEXT DEFAULT 'Active'
+    );
+    CREATE TABLE estimate_master (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        estimate_no TEXT,
+        date TEXT
+    );"""
+
+
+def create_baseline(db_file, lines):
+    # Returns the number of estimates written
+    conn = sqlite3.connect(db_file)
+    conn.executescript(BASELINE_SCHEMA)
+    rng = random.Random(0)
+    estimates = (lines + UPGRADE_LINES_PER_ESTIMATE - 1) // UPGRADE_LINES_PER_ESTIMATE
+    conn.executemany("INSERT INTO estimate_master (estimate_no, date) VALUES (?, ?)",
+                     ((f"abc/2020/{n:06d}", f"2020-{n % 12 + 1:02d}-01") for n in range(1, estimates + 1)))
+    rows = []
+    for i in range(lines):
+        n = i // UPGRADE_LINES_PER_ESTIMATE + 1
+        desc, rate = rng.choice(ITEMS)
+        qty = float(rng.randint(1, 10))
+        rows.append((f"abc/2020/{n:06d}", f"2020-{n % 12 + 1:02d}-01", desc, qty, rate, qty * rate,
+                     rng.choice(["Cash", "Credit"])))
+    conn.executemany("""INSERT INTO estimates (estimate_no, date, description, qty, unit_price, total, payment_mode)
+                        VALUES (?,?,?,?,?,?,?)""", rows)
+    conn.commit()
+    conn.close()
+    return estimates
+
+
+def terminal(db_file, terminal_id, estimates, busy_timeout, results, start):
+    start.wait()  # open together, so an old file is migrated by whichever gets there first
+    try:
+        # The default busy timeout while another terminal may still be migrating
+        engine = BillingEngine(db_file, terminal_id=terminal_id)
+    except sqlite3.Error as e:
+        results.put((terminal_id, 0, 0, estimates, 0.0, f"could not open the database: {e}"))
+        return
+    engine.c.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    rng = random.Random(terminal_id)
+    saved = cancelled = failed = 0
+    subtotal = 0.0
+    for i in range(1, estimates + 1):
+        estimate = engine.new_estimate(rng.choice(["Cash", "Credit"]))
+        for desc, rate in rng.sample(ITEMS, rng.randint(1, 3)):
+            estimate.add_line(desc, float(rng.randint(1, 10)), rate)
+        try:
+            master_id = engine.commit_estimate(estimate)
+        except sqlite3.OperationalError:
+            failed += 1
+            continue
+        saved += 1
+        subtotal += estimate.subtotal
+        if i % CANCEL_EVERY == 0:
+            try:
+                if engine.cancel_estimate(master_id):
+                    cancelled += 1
+                    subtotal -= estimate.subtotal
+            except sqlite3.OperationalError:
+                failed += 1
+    engine.close()
+    results.put((terminal_id, saved, cancelled, failed, round(subtotal, 2), None))
+
+
+def check(db_file, outcomes, baseline_estimates=0, baseline_lines=0):
+    engine = BillingEngine(db_file)
+    c = engine.c
+    problems = []
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version != len(SCHEMA_MIGRATIONS):
+        problems.append(f"schema at version {version}, expected {len(SCHEMA_MIGRATIONS)}")
+    if baseline_lines:
+        linked = c.execute("""SELECT COUNT(*) FROM estimates e JOIN estimate_master m ON m.id = e.master_id
+                              WHERE m.terminal_id IS NULL""").fetchone()[0]
+        if linked != baseline_lines:
+            problems.append(f"{linked} upgraded lines linked to their estimate, expected {baseline_lines}")
+    saved = sum(o[1] for o in outcomes.values()) + baseline_estimates
+    cancelled = sum(o[2] for o in outcomes.values())
+    headers, numbers = c.execute("SELECT COUNT(*), COUNT(DISTINCT estimate_no) FROM estimate_master").fetchone()
+    if headers != saved:
+        problems.append(f"{headers} estimates in the database, {saved} reported saved")
+    if numbers != headers:
+        problems.append(f"{headers - numbers} duplicate estimate numbers")
+    db_cancelled = c.execute("SELECT COUNT(*) FROM estimate_master WHERE status='Cancelled'").fetchone()[0]
+    if db_cancelled != cancelled:
+        problems.append(f"{db_cancelled} cancelled in the database, {cancelled} reported")
+    orphans = c.execute("""SELECT COUNT(*) FROM estimate_master m
+                           WHERE NOT EXISTS (SELECT 1 FROM estimates e WHERE e.master_id = m.id)""").fetchone()[0]
+    if orphans:
+        problems.append(f"{orphans} estimates without lines")
+    raw = c.execute("SELECT ROUND(TOTAL(total), 2) FROM estimates WHERE status='Active'").fetchone()[0]
+    for table in ("daily_summary", "monthly_summary", "yearly_summary"):
+        summary = c.execute(f"SELECT ROUND(TOTAL(total), 2) FROM {table}").fetchone()[0]
+        if abs(summary - raw) > 0.01:
+            problems.append(f"{table} total {summary} differs from the active lines {raw}")
+    dates = c.execute("SELECT MIN(date), MAX(date) FROM estimate_master WHERE terminal_id IS NOT NULL").fetchone()
+    for terminal_id, count, subtotal in engine.terminal_totals(*dates):
+        expected = outcomes.get(terminal_id)
+        if expected is None or abs(subtotal - expected[4]) > 0.01:
+            problems.append(f"terminal {terminal_id} total {subtotal:.2f}, expected {expected and expected[4]}")
+    engine.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent save/cancel stress test for a shared database.")
+    parser.add_argument("--terminals", type=int, default=4, help="concurrent processes")
+    parser.add_argument("--estimates", type=int, default=250, help="estimates saved per process")
+    parser.add_argument("--busy-timeout", type=int, default=100, help="busy_timeout in ms; low values force retries")
+    parser.add_argument("--db", help="database file to use (default: a new temporary file)")
+    parser.add_argument("--upgrade-lines", type=int, default=0,
+                        help="start from an un-migrated file in the original layout with this many lines")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_file = args.db or os.path.join(work_dir, "stress.db")
+        baseline_estimates = 0
+        if args.upgrade_lines:
+            if os.path.exists(db_file):
+                sys.exit(f"error: {db_file} already exists")
+            baseline_estimates = create_baseline(db_file, args.upgrade_lines)
+            print(f"Created an un-migrated database with {args.upgrade_lines} lines")
+        else:
+            BillingEngine(db_file).close()  # create and migrate before the terminals start
+
+        results = multiprocessing.Queue()
+        start = multiprocessing.Event()
+        processes = [multiprocessing.Process(target=terminal,
+                                             args=(db_file, f"T{n}", args.estimates, args.busy_timeout, results, start))
+                     for n in range(1, args.terminals + 1)]
+        for process in processes:
+            process.start()
+        started = time.perf_counter()
+        start.set()
+        outcomes = {}
+        for _ in processes:
+            outcome = results.get()
+            outcomes[outcome[0]] = outcome
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        problems = []
+        for terminal_id, saved, cancelled, failed, subtotal, error in sorted(outcomes.values()):
+            print(f"{terminal_id}: saved {saved}, cancelled {cancelled}, failed {failed}, total {subtotal:.2f}")
+            if error:
+                problems.append(f"terminal {terminal_id} {error}")
+        saved = sum(o[1] for o in outcomes.values())
+        print(f"{saved} estimates in {elapsed:.1f}s ({saved / elapsed:.0f}/s)")
+
+        problems += check(db_file, outcomes, baseline_estimates, args.upgrade_lines)
+        if any(process.exitcode for process in processes):
+            problems.append("a terminal process exited with an error")
+        if any(o[3] for o in outcomes.values()):
+            problems.append("some writes failed after all retries")
+        for problem in problems:
+            print("FAIL:", problem)
+        print("OK" if not problems else f"{len(problems)} problems")
+        return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())